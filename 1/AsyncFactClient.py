@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import time
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from FactClient import decode_result
+from FactClient import make_proxy
+
+class AsyncFactClient:
+
+	def __init__(self, url, connections=100, gzip=True):
+		# At most `connections` keep-alive sockets are open at once; calls
+		# beyond that wait for a free one.
+		parts = urlsplit(url)
+		self.host = parts.hostname
+		self.port = parts.port or 80
+		self.path = parts.path or "/RPC2"
+		self.gzip = gzip
+		self._idle = []
+		self._slots = asyncio.Semaphore(connections)
+
+	async def calculate_factorial(self, n, encoding="binary"):
+		return decode_result(await self.call("calculate_factorial", n, encoding))
+
+	async def calculate_factorials(self, values, encoding="binary"):
+		return [decode_result(value) for value in await self.call("calculate_factorials", values, encoding)]
+
+	async def call(self, method, *params):
+		body = xmlrpc.client.dumps(params, method).encode()
+		headers = f"POST {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Type: text/xml\r\n"
+		if self.gzip:
+			headers += "Accept-Encoding: gzip\r\n"
+			if len(body) > 1400:
+				body = xmlrpc.client.gzip_encode(body)
+				headers += "Content-Encoding: gzip\r\n"
+		request = (headers + f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
+		async with self._slots:
+			reused = bool(self._idle)
+			conn = self._idle.pop() if reused else await asyncio.open_connection(self.host, self.port)
+			while True:
+				try:
+					response, keep_alive = await self._exchange(conn, request)
+					break
+				except (asyncio.IncompleteReadError, ConnectionError):
+					conn[1].close()
+					if not reused:
+						raise
+					# The server dropped an idle keep-alive connection, retry on a new one
+					reused = False
+					conn = await asyncio.open_connection(self.host, self.port)
+				except BaseException:
+					# A non-200 reply or a cancelled call leaves the stream in an
+					# unknown state, so the connection is not reused
+					conn[1].close()
+					raise
+			if keep_alive:
+				self._idle.append(conn)
+			else:
+				conn[1].close()
+		return xmlrpc.client.loads(response)[0][0]
+
+	async def _exchange(self, conn, request):
+		reader, writer = conn
+		writer.write(request)
+		await writer.drain()
+		status = (await reader.readuntil(b"\r\n")).split(None, 2)
+		headers = {}
+		while True:
+			line = await reader.readuntil(b"\r\n")
+			if line == b"\r\n":
+				break
+			name, _, value = line.decode("latin-1").partition(":")
+			headers[name.strip().lower()] = value.strip()
+		body = await reader.readexactly(int(headers.get("content-length", 0)))
+		if int(status[1]) != 200:
+			raise xmlrpc.client.ProtocolError(self.host + self.path, int(status[1]), status[2].decode().strip(), headers)
+		if headers.get("content-encoding") == "gzip":
+			body = xmlrpc.client.gzip_decode(body, max_decode=-1)
+		# Connection: close still carries a complete response; only the
+		# socket is not reusable
+		return body, headers.get("connection", "").lower() != "close"
+
+	async def close(self):
+		while self._idle:
+			self._idle.pop()[1].close()
+
+async def run_async(url, values, connections):
+	client = AsyncFactClient(url, connections)
+	start = time.perf_counter()
+	results = await asyncio.gather(*(client.calculate_factorial(n) for n in values))
+	elapsed = time.perf_counter() - start
+	await client.close()
+	return results, elapsed
+
+def run_blocking(url, values, threads):
+	# The existing path: a new ServerProxy (and TCP connection) per call
+	def call(n):
+		with make_proxy(url) as proxy:
+			return decode_result(proxy.calculate_factorial(n, "binary"))
+	start = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=threads) as executor:
+		results = list(executor.map(call, values))
+	return results, time.perf_counter() - start
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="asyncio XML-RPC factorial client")
+	parser.add_argument("--url", default="http://localhost:8001/RPC2")
+	parser.add_argument("--connections", type=int, default=100,
+		help="size of the keep-alive connection pool")
+	parser.add_argument("--requests", type=int, default=5000)
+	parser.add_argument("--max-n", type=int, default=200,
+		help="requests cycle through n = 0..max-n")
+	parser.add_argument("--baseline-url", default=None,
+		help="also run the same requests through ServerProxy threads against this URL (e.g. http://localhost:8000/RPC2)")
+	return parser.parse_args()
+
+def main():
+	args = parse_args()
+	values = [i % (args.max_n + 1) for i in range(args.requests)]
+	results, elapsed = asyncio.run(run_async(args.url, values, args.connections))
+	print(f"asyncio pool   {args.url}: {len(values) / elapsed:.0f} calls/s ({elapsed:.2f}s)")
+	if args.baseline_url:
+		baseline, elapsed = run_blocking(args.baseline_url, values, args.connections)
+		if baseline != results:
+			raise RuntimeError("baseline returned different results")
+		print(f"ServerProxy    {args.baseline_url}: {len(values) / elapsed:.0f} calls/s ({elapsed:.2f}s)")
+
+if __name__ == "__main__":
+	main()
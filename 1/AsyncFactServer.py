@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from xmlrpc.client import gzip_decode
+from xmlrpc.client import gzip_encode
+from xmlrpc.server import SimpleXMLRPCDispatcher
+
+from FactServer import FactorialServer
+from FactServer import RequestHandler
+from FactServer import StatsDispatcherMixin
+from FactServer import configure_cache
+from FactServer import start_pool
+
+# asyncio front-end for FactorialServer: one coroutine per keep-alive HTTP
+# connection, marshalling and dispatch in a thread pool, large n in the
+# process pool owned by FactorialServer.
+
+class InstrumentedDispatcher(StatsDispatcherMixin, SimpleXMLRPCDispatcher):
+
+	pass
+
+class AsyncXMLRPCServer:
+
+	def __init__(self, dispatcher, executor, rpc_paths=RequestHandler.rpc_paths, gzip_threshold=1400):
+		self.dispatcher = dispatcher
+		self.executor = executor
+		self.rpc_paths = rpc_paths
+		self.gzip_threshold = gzip_threshold
+
+	async def handle(self, reader, writer):
+		loop = asyncio.get_running_loop()
+		client = writer.get_extra_info("peername")
+		try:
+			while True:
+				request_line = await reader.readline()
+				if not request_line:
+					break
+				method, path, version = request_line.decode("latin-1").split()
+				headers = {}
+				while True:
+					line = await reader.readline()
+					if line in (b"\r\n", b"\n", b""):
+						break
+					name, _, value = line.decode("latin-1").partition(":")
+					headers[name.strip().lower()] = value.strip()
+				body = await reader.readexactly(int(headers.get("content-length", 0)))
+				keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+				if method != "POST" or path not in self.rpc_paths:
+					self.write_response(writer, 404, b"", keep_alive)
+				else:
+					if headers.get("content-encoding") == "gzip":
+						body = gzip_decode(body)
+					response = await loop.run_in_executor(self.executor, self.dispatcher._marshaled_dispatch_from, client and client[0], body)
+					gzipped = bool(self.gzip_threshold) and len(response) > self.gzip_threshold and "gzip" in headers.get("accept-encoding", "")
+					if gzipped:
+						response = gzip_encode(response)
+					self.write_response(writer, 200, response, keep_alive, gzipped)
+				await writer.drain()
+				if not keep_alive:
+					break
+		except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+			pass
+		finally:
+			writer.close()
+
+	def write_response(self, writer, status, body, keep_alive, gzipped=False):
+		reason = "OK" if status == 200 else "Not Found"
+		head = [f"HTTP/1.1 {status} {reason}", "Content-Type: text/xml", f"Content-Length: {len(body)}"]
+		if gzipped:
+			head.append("Content-Encoding: gzip")
+		if not keep_alive:
+			head.append("Connection: close")
+		writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="asyncio XML-RPC factorial server")
+	parser.add_argument("--host", default="localhost")
+	parser.add_argument("--port", type=int, default=8001)
+	parser.add_argument("--threads", type=int, default=32,
+		help="threads used for marshalling and small factorials")
+	parser.add_argument("--workers", type=int, default=os.cpu_count(),
+		help="process pool size for large n (0 computes everything in threads)")
+	parser.add_argument("--inline-limit", type=int, default=1000,
+		help="largest n computed in a thread instead of the process pool")
+	parser.add_argument("--max-pending", type=int, default=None,
+		help="pool jobs allowed at once before rejecting (default: 2 * workers)")
+	parser.add_argument("--gzip-threshold", type=int, default=1400,
+		help="gzip responses larger than this many bytes when the client accepts it (0 disables)")
+	parser.add_argument("--cache-bytes", type=int, default=64 * 1024 * 1024,
+		help="memory budget of the factorial checkpoint cache, per process")
+	return parser.parse_args()
+
+async def serve(args):
+	configure_cache(args.cache_bytes)
+	pool = None
+	if args.workers:
+		pool = start_pool(args.workers, args.cache_bytes)
+	executor = ThreadPoolExecutor(max_workers=args.threads)
+	dispatcher = InstrumentedDispatcher()
+	dispatcher.register_introspection_functions()
+	dispatcher.register_multicall_functions()
+	dispatcher.register_stats_function()
+	dispatcher.register_instance(FactorialServer(pool, args.inline_limit, args.max_pending or 2 * (args.workers or 1)))
+	rpc = AsyncXMLRPCServer(dispatcher, executor, gzip_threshold=args.gzip_threshold)
+	server = await asyncio.start_server(rpc.handle, args.host, args.port, backlog=1024)
+	asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+	print("Async FactorialServer is ready to accept requests.")
+	try:
+		async with server:
+			await server.serve_forever()
+	except asyncio.CancelledError:
+		# server.close() from SIGTERM ends serve_forever this way
+		pass
+	finally:
+		executor.shutdown(cancel_futures=True)
+		if pool is not None:
+			pool.shutdown(cancel_futures=True)
+
+def main():
+	try:
+		asyncio.run(serve(parse_args()))
+	except KeyboardInterrupt:
+		pass
+
+if __name__ == "__main__":
+	main()
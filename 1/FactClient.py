@@ -1,10 +1,95 @@
+import argparse
+import time
 import xmlrpc.client
-# Create an XML-RPC client
-with xmlrpc.client.ServerProxy("http://localhost:8000/RPC2") as proxy:
-	try:
-# Replace 5 with the desired integer value
-		input_value = 5
-		result = proxy.calculate_factorial(input_value)
-		print(f"Factorial of {input_value} is: {result}")
-	except Exception as e:
-		print(f"Error: {e}")
+
+def make_proxy(url, gzip=True):
+	# Responses are gzipped by the server when we send Accept-Encoding: gzip;
+	# encode_threshold makes the transport compress large requests as well.
+	if url.startswith("https"):
+		transport = xmlrpc.client.SafeTransport()
+	else:
+		transport = xmlrpc.client.Transport()
+	transport.accept_gzip_encoding = gzip
+	transport.encode_threshold = 1400 if gzip else None
+	return xmlrpc.client.ServerProxy(url, transport=transport)
+
+def decode_result(value):
+	if isinstance(value, xmlrpc.client.Binary):
+		return int.from_bytes(value.data, "big")
+	if isinstance(value, str):
+		return int(value, 16)
+	return value
+
+def describe(n, result):
+	# Python refuses to print ints with more than 4300 digits by default
+	if result.bit_length() > 4096:
+		return f"Factorial of {n} has {result.bit_length()} bits"
+	return f"Factorial of {n} is: {result}"
+
+def factorials_single(proxy, values, encoding="int"):
+	return [decode_result(proxy.calculate_factorial(n, encoding)) for n in values]
+
+def factorials_multicall(proxy, values, encoding="int"):
+	# One HTTP round trip, one server dispatch per value
+	multicall = xmlrpc.client.MultiCall(proxy)
+	for n in values:
+		multicall.calculate_factorial(n, encoding)
+	return [decode_result(value) for value in multicall()]
+
+def factorials_batch(proxy, values, encoding="int"):
+	# One HTTP round trip, one server dispatch for the whole list
+	return [decode_result(value) for value in proxy.calculate_factorials(values, encoding)]
+
+def compare(proxy, count, encoding="int"):
+	values = [i % 13 for i in range(count)]
+	expected = None
+	for name, func in (("single", factorials_single), ("multicall", factorials_multicall), ("batch", factorials_batch)):
+		start = time.perf_counter()
+		results = func(proxy, values, encoding)
+		elapsed = time.perf_counter() - start
+		if expected is None:
+			expected = results
+		elif results != expected:
+			raise RuntimeError(f"{name} returned different results")
+		print(f"{name:>9}: {count} values in {elapsed:.3f}s ({count / elapsed:.0f} values/s, {elapsed / count * 1e6:.1f} us/value)")
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="XML-RPC factorial client")
+	parser.add_argument("--url", default="http://localhost:8000/RPC2")
+	parser.add_argument("values", nargs="*", type=int, default=[5],
+		help="compute these factorials (more than one uses calculate_factorials)")
+	parser.add_argument("--multicall", action="store_true",
+		help="send several values with system.multicall instead of calculate_factorials")
+	parser.add_argument("--encoding", choices=("int", "hex", "binary"), default="binary",
+		help="result encoding; int only works up to 12!")
+	parser.add_argument("--no-gzip", action="store_true",
+		help="do not compress requests or accept compressed responses")
+	parser.add_argument("--mod", type=int, default=None, metavar="M",
+		help="compute n! mod M on the server instead of the full factorial")
+	parser.add_argument("--compare", type=int, metavar="COUNT",
+		help="time COUNT values through single calls, multicall and the batch RPC")
+	return parser.parse_args()
+
+def main():
+	args = parse_args()
+	# Create an XML-RPC client
+	with make_proxy(args.url, gzip=not args.no_gzip) as proxy:
+		try:
+			if args.compare:
+				compare(proxy, args.compare, args.encoding)
+			elif args.mod:
+				for input_value, result in zip(args.values, proxy.calculate_factorials_mod(args.values, args.mod)):
+					print(f"Factorial of {input_value} mod {args.mod} is: {result}")
+			elif len(args.values) == 1:
+				input_value = args.values[0]
+				result = decode_result(proxy.calculate_factorial(input_value, args.encoding))
+				print(describe(input_value, result))
+			else:
+				fetch = factorials_multicall if args.multicall else factorials_batch
+				for input_value, result in zip(args.values, fetch(proxy, args.values, args.encoding)):
+					print(describe(input_value, result))
+		except Exception as e:
+			print(f"Error: {e}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,224 @@
+import argparse
+import http.client
+import itertools
+import json
+import math
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import xmlrpc.client
+
+from FactClient import decode_result
+from FactClient import make_proxy
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Server modes the harness can start itself
+SERVERS = {
+	"simple": ["FactServer.py", "--mode", "simple"],
+	"threaded": ["FactServer.py", "--mode", "threaded"],
+	"async": ["AsyncFactServer.py"],
+}
+
+def parse_mix(text):
+	# "5:70,1000:25,50000:5" -> ([5, 1000, 50000], [70, 25, 5])
+	values, weights = [], []
+	for item in text.split(","):
+		n, _, weight = item.partition(":")
+		values.append(int(n))
+		weights.append(float(weight or 1))
+	return values, weights
+
+def port_in_use(port):
+	with socket.socket() as sock:
+		sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		try:
+			sock.bind(("localhost", port))
+		except OSError:
+			return True
+	return False
+
+def server_ready(port, timeout=2.0):
+	# One system.listMethods call with a socket timeout, so a process that
+	# accepts connections but never answers cannot hang the harness
+	connection = http.client.HTTPConnection("localhost", port, timeout=timeout)
+	try:
+		connection.request("POST", "/RPC2", xmlrpc.client.dumps((), "system.listMethods"),
+			{"Content-Type": "text/xml"})
+		return connection.getresponse().status == 200
+	finally:
+		connection.close()
+
+def start_server(mode, port, extra_args):
+	if port_in_use(port):
+		raise RuntimeError(f"port {port} is already in use")
+	cmd = [sys.executable] + SERVERS[mode] + ["--port", str(port)] + extra_args
+	# Own process group, so stop_server can reach the server's pool workers
+	process = subprocess.Popen(cmd, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+		start_new_session=True)
+	url = f"http://localhost:{port}/RPC2"
+	deadline = time.monotonic() + 10
+	while True:
+		try:
+			if server_ready(port):
+				return process, url
+		except OSError:
+			pass
+		if process.poll() is not None or time.monotonic() > deadline:
+			stop_server(process)
+			raise RuntimeError(f"{mode} server did not start: {' '.join(cmd)}")
+		time.sleep(0.1)
+
+def stop_server(process, timeout=10):
+	# SIGINT lets the server shut its pool down; whatever is left of the
+	# process group afterwards is killed
+	if process.poll() is None:
+		process.send_signal(signal.SIGINT)
+		try:
+			process.wait(timeout)
+		except subprocess.TimeoutExpired:
+			pass
+	try:
+		os.killpg(process.pid, signal.SIGKILL)
+	except ProcessLookupError:
+		pass
+	process.wait()
+
+def percentile(sorted_values, q):
+	if not sorted_values:
+		return None
+	index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+	return sorted_values[index]
+
+def summarize(latencies):
+	# latencies in seconds -> milliseconds summary
+	latencies = sorted(latencies)
+	if not latencies:
+		return {"count": 0}
+	return {
+		"count": len(latencies),
+		"mean": 1000 * sum(latencies) / len(latencies),
+		"p50": 1000 * percentile(latencies, 50),
+		"p95": 1000 * percentile(latencies, 95),
+		"p99": 1000 * percentile(latencies, 99),
+		"max": 1000 * latencies[-1],
+	}
+
+def histogram(latencies):
+	# Power-of-two buckets starting at 0.125 ms
+	buckets = {}
+	for latency in latencies:
+		bucket = max(0, math.ceil(math.log2(max(latency * 1000, 1e-9) / 0.125)))
+		buckets[bucket] = buckets.get(bucket, 0) + 1
+	return [{"le_ms": 0.125 * 2 ** b, "count": buckets[b]} for b in sorted(buckets)]
+
+def run_load(url, clients, total, duration, values, weights, encoding, seed):
+	counter = itertools.count()
+	deadline = time.perf_counter() + duration if duration else None
+	records = []
+	errors = []
+	lock = threading.Lock()
+
+	def client(index):
+		rng = random.Random(seed + index)
+		local, local_errors = [], []
+		with make_proxy(url) as proxy:
+			while True:
+				if deadline is not None:
+					if time.perf_counter() >= deadline:
+						break
+				elif next(counter) >= total:
+					break
+				n = rng.choices(values, weights)[0]
+				start = time.perf_counter()
+				try:
+					decode_result(proxy.calculate_factorial(n, encoding))
+				except (xmlrpc.client.Error, OSError) as e:
+					local_errors.append((n, type(e).__name__))
+					continue
+				local.append((n, time.perf_counter() - start))
+		with lock:
+			records.extend(local)
+			errors.extend(local_errors)
+
+	threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+	start = time.perf_counter()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	return records, errors, time.perf_counter() - start
+
+def git_commit():
+	try:
+		return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+			capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="Load test for the XML-RPC factorial service")
+	parser.add_argument("--server", choices=sorted(SERVERS) + ["none"], default="simple",
+		help="server mode to start, or 'none' to use --url")
+	parser.add_argument("--url", default="http://localhost:8000/RPC2")
+	parser.add_argument("--port", type=int, default=8100, help="port for a server started by the harness")
+	parser.add_argument("--server-args", default="", help="extra arguments for the started server")
+	parser.add_argument("--clients", type=int, default=16)
+	parser.add_argument("--requests", type=int, default=2000, help="total requests (ignored with --duration)")
+	parser.add_argument("--duration", type=float, default=None, help="run for this many seconds instead")
+	parser.add_argument("--mix", default="10:60,500:30,5000:10", help="comma separated n:weight pairs")
+	parser.add_argument("--encoding", choices=("int", "hex", "binary"), default="binary")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--json", default=None, help="write the report to this file")
+	return parser.parse_args()
+
+def main():
+	args = parse_args()
+	values, weights = parse_mix(args.mix)
+	process = None
+	url = args.url
+	if args.server != "none":
+		process, url = start_server(args.server, args.port, args.server_args.split())
+	try:
+		records, errors, elapsed = run_load(url, args.clients, args.requests, args.duration,
+			values, weights, args.encoding, args.seed)
+	finally:
+		if process is not None:
+			stop_server(process)
+
+	latencies = [latency for _, latency in records]
+	report = {
+		"commit": git_commit(),
+		"server": args.server,
+		"url": url,
+		"clients": args.clients,
+		"mix": dict(zip(values, weights)),
+		"encoding": args.encoding,
+		"requests": len(records),
+		"errors": len(errors),
+		"error_types": {name: sum(1 for _, e in errors if e == name) for name in {e for _, e in errors}},
+		"elapsed_s": elapsed,
+		"throughput_rps": len(records) / elapsed if elapsed else 0.0,
+		"latency_ms": summarize(latencies),
+		"histogram": histogram(latencies),
+		"per_n": {n: summarize([latency for m, latency in records if m == n]) for n in values},
+	}
+
+	summary = report["latency_ms"]
+	print(f"{args.server} server, {args.clients} clients: {report['requests']} ok, {report['errors']} errors in {elapsed:.2f}s -> {report['throughput_rps']:.0f} req/s")
+	if summary["count"]:
+		print(f"latency ms: p50 {summary['p50']:.2f}  p95 {summary['p95']:.2f}  p99 {summary['p99']:.2f}  max {summary['max']:.2f}")
+	for bucket in report["histogram"]:
+		print(f"  <= {bucket['le_ms']:>9.3f} ms  {bucket['count']}")
+	if args.json:
+		with open(args.json, "w") as f:
+			json.dump(report, f, indent=2)
+		print(f"Report written to {args.json}")
+
+if __name__ == "__main__":
+	main()
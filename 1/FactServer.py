@@ -1,25 +1,489 @@
+import argparse
+import bisect
+import math
+import os
+import signal
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from socketserver import ThreadingMixIn
+from xmlrpc.client import Binary
+from xmlrpc.client import Fault
 from xmlrpc.server import SimpleXMLRPCServer
 from xmlrpc.server import SimpleXMLRPCRequestHandler
-class FactorialServer:
 
-	def calculate_factorial(self, n):
+# Fault code returned when the process pool has no free slot
+SERVER_BUSY = -32500
 
-		if n < 0:
-			raise ValueError("Input must 				be a non-negative integer.")
+# How results are marshalled: "int" is plain XML-RPC <int> (32-bit only),
+# "hex" is a hexadecimal string and "binary" is big-endian bytes in <base64>.
+ENCODINGS = ("int", "hex", "binary")
+
+def product_range(lo, hi):
+	# Product of lo..hi-1 by binary splitting, so the big multiplications
+	# happen between operands of similar size.
+	if hi - lo <= 16:
 		result = 1
-		for i in range(1, n + 1):
+		for i in range(lo, hi):
 			result *= i
 		return result
+	mid = (lo + hi) // 2
+	return product_range(lo, mid) * product_range(mid, hi)
+
+class FactorialCache:
+
+	def __init__(self, max_bytes=64 * 1024 * 1024, min_n=1000):
+		# Only n >= min_n is worth keeping; eviction is least recently used
+		# until the cached values fit in max_bytes.
+		self.max_bytes = max_bytes
+		self.min_n = min_n
+		self.size = 0
+		self._values = OrderedDict()
+		self._keys = []
+		self._lock = threading.Lock()
+
+	def nearest(self, n):
+		# Largest cached (k, k!) with k <= n, or None
+		with self._lock:
+			i = bisect.bisect_right(self._keys, n)
+			if i == 0:
+				return None
+			k = self._keys[i - 1]
+			self._values.move_to_end(k)
+			return k, self._values[k]
+
+	def put(self, n, value):
+		nbytes = sys.getsizeof(value)
+		if n < self.min_n or nbytes > self.max_bytes:
+			return
+		with self._lock:
+			if n in self._values:
+				self._values.move_to_end(n)
+				return
+			self._values[n] = value
+			bisect.insort(self._keys, n)
+			self.size += nbytes
+			while self.size > self.max_bytes:
+				k, old = self._values.popitem(last=False)
+				self._keys.remove(k)
+				self.size -= sys.getsizeof(old)
+
+# Per-process cache, also used inside pool workers
+_cache = FactorialCache()
+
+def configure_cache(max_bytes):
+	global _cache
+	_cache = FactorialCache(max_bytes)
+
+def factorial(n):
+	if n < _cache.min_n:
+		return math.factorial(n)
+	hit = _cache.nearest(n)
+	if hit is not None and 2 * hit[0] >= n:
+		k, value = hit
+		if k == n:
+			return value
+		result = value * product_range(k + 1, n + 1)
+	else:
+		result = math.factorial(n)
+	_cache.put(n, result)
+	return result
+
+def encode_result(value, encoding):
+	if encoding == "int":
+		return value
+	if encoding == "hex":
+		return format(value, "x")
+	if encoding == "binary":
+		return Binary(value.to_bytes((value.bit_length() + 7) // 8 or 1, "big"))
+	raise ValueError(f"Unknown encoding {encoding!r}, expected one of {ENCODINGS}.")
+
+def factorials(values):
+	# Walk the distinct values in ascending order, carrying the running
+	# product forward so the whole batch costs about one factorial of max(values).
+	results = {}
+	prev = None
+	for n in sorted(set(values)):
+		if prev is None:
+			acc = factorial(n)
+		else:
+			acc *= product_range(prev + 1, n + 1)
+		results[n] = acc
+		prev = n
+	return [results[n] for n in values]
+
+# Spacing of the checkpoints kept by FactorialModTable
+MOD_BLOCK = 4096
+
+def product_range_mod(lo, hi, m):
+	# Product of lo..hi-1 modulo m; math.prod over short runs keeps the
+	# operands to a few machine words and the loop mostly in C.
+	result = 1 % m
+	for start in range(lo, hi, 32):
+		result = result * math.prod(range(start, min(start + 32, hi))) % m
+		if not result:
+			break
+	return result
+
+def is_prime(m):
+	# Deterministic Miller-Rabin for m < 3.3 * 10**24
+	if m < 2:
+		return False
+	small = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+	if m in small:
+		return True
+	if any(m % p == 0 for p in small):
+		return False
+	d, s = m - 1, 0
+	while d % 2 == 0:
+		d, s = d // 2, s + 1
+	for a in small:
+		x = pow(a, d, m)
+		if x in (1, m - 1):
+			continue
+		for _ in range(s - 1):
+			x = x * x % m
+			if x == m - 1:
+				break
+		else:
+			return False
+	return True
+
+class FactorialModTable:
+
+	def __init__(self, m):
+		# blocks[k] = (k * MOD_BLOCK)! mod m, extended on demand, so a lookup
+		# costs at most MOD_BLOCK multiplications once the table is built.
+		self.m = m
+		self.prime = is_prime(m)
+		self.blocks = [1 % m]
+		self._lock = threading.Lock()
+
+	def factorial(self, n):
+		m = self.m
+		if n >= m:
+			return 0
+		if self.prime and n > m // 2:
+			# Wilson: n! * (p-1-n)! = (-1)^(p-n) mod p, so only n < p/2 is
+			# ever walked.
+			r = pow(self.factorial(m - 1 - n), -1, m)
+			return r if (m - n) % 2 == 0 else (m - r) % m
+		k = n // MOD_BLOCK
+		with self._lock:
+			# For composite m, n! is 0 from some n on; the table stops
+			# growing at the first zero checkpoint
+			while len(self.blocks) <= k and self.blocks[-1]:
+				i = len(self.blocks)
+				self.blocks.append(self.blocks[-1] * product_range_mod((i - 1) * MOD_BLOCK + 1, i * MOD_BLOCK + 1, m) % m)
+			base = self.blocks[min(k, len(self.blocks) - 1)]
+		if not base:
+			return 0
+		return base * product_range_mod(k * MOD_BLOCK + 1, n + 1, m) % m
+
+_mod_tables = OrderedDict()
+_mod_tables_lock = threading.Lock()
+
+def mod_table(m, max_tables=256):
+	with _mod_tables_lock:
+		table = _mod_tables.get(m)
+		if table is None:
+			table = _mod_tables[m] = FactorialModTable(m)
+			if len(_mod_tables) > max_tables:
+				_mod_tables.popitem(last=False)
+		else:
+			_mod_tables.move_to_end(m)
+		return table
+
+def factorial_mod(n, m):
+	return mod_table(m).factorial(n)
+
+def factorials_mod(values, m):
+	# Same ascending walk as factorials(), but close values are stepped from
+	# the previous one and distant ones looked up in the table.
+	table = mod_table(m)
+	results = {}
+	prev = None
+	for n in sorted(set(values)):
+		if prev is not None and n < m and n - prev < MOD_BLOCK:
+			acc = acc * product_range_mod(prev + 1, n + 1, m) % m
+		else:
+			acc = table.factorial(n)
+		results[n] = acc
+		prev = n
+	return [results[n] for n in values]
+
+class FactorialServer:
+
+	def __init__(self, pool=None, inline_limit=1000, max_pending=None):
+		# Values of n up to inline_limit are computed in the request thread,
+		# larger ones go to the process pool (if any).
+		self._pool = pool
+		self._inline_limit = inline_limit
+		self._slots = threading.BoundedSemaphore(max_pending) if pool and max_pending else None
+
+	def calculate_factorial(self, n, encoding="int"):
+
+		if n < 0:
+			raise ValueError("Input must be a non-negative integer.")
+		if encoding not in ENCODINGS:
+			raise ValueError(f"Unknown encoding {encoding!r}, expected one of {ENCODINGS}.")
+		if self._pool is None or n <= self._inline_limit:
+			return encode_result(factorial(n), encoding)
+		return encode_result(self._submit(factorial, n), encoding)
+
+	def calculate_factorials(self, values, encoding="int"):
+
+		if any(n < 0 for n in values):
+			raise ValueError("Input must be a non-negative integer.")
+		if encoding not in ENCODINGS:
+			raise ValueError(f"Unknown encoding {encoding!r}, expected one of {ENCODINGS}.")
+		if self._pool is None or not values or max(values) <= self._inline_limit:
+			results = factorials(values)
+		else:
+			results = self._submit(factorials, values)
+		return [encode_result(value, encoding) for value in results]
+
+	def calculate_factorial_mod(self, n, m):
+
+		if n < 0:
+			raise ValueError("Input must be a non-negative integer.")
+		if m < 1:
+			raise ValueError("Modulus must be a positive integer.")
+		# A cold table for large n takes seconds; like plain factorials that
+		# work goes to the pool (each worker keeps its own tables)
+		if self._pool is None or min(n, m) <= self._inline_limit:
+			return factorial_mod(n, m)
+		return self._submit(factorial_mod, n, m)
+
+	def calculate_factorials_mod(self, values, m):
+
+		if any(n < 0 for n in values):
+			raise ValueError("Input must be a non-negative integer.")
+		if m < 1:
+			raise ValueError("Modulus must be a positive integer.")
+		if self._pool is None or not values or min(max(values), m) <= self._inline_limit:
+			return factorials_mod(values, m)
+		return self._submit(factorials_mod, values, m)
+
+	def _submit(self, func, *args):
+		if self._slots is not None and not self._slots.acquire(blocking=False):
+			raise Fault(SERVER_BUSY, "Server is busy, try again later.")
+		try:
+			return self._pool.submit(func, *args).result()
+		finally:
+			if self._slots is not None:
+				self._slots.release()
+
+class RequestStats:
+
+	# Latencies go into power-of-two microsecond buckets and n into
+	# power-of-two ranges, so recording a call is a few dict updates under
+	# one lock and percentiles are read back from the histograms.
+	max_clients = 1000
+
+	def __init__(self):
+		self.started = time.time()
+		self.methods = {}
+		self.n_ranges = {}
+		self.clients = {}
+		self.local = threading.local()
+		self._lock = threading.Lock()
+
+	def _method(self, name):
+		entry = self.methods.get(name)
+		if entry is None:
+			entry = self.methods[name] = {"calls": 0, "errors": 0, "in_flight": 0, "seconds": 0.0,
+				"max_seconds": 0.0, "buckets": {}, "request_bytes": 0, "response_bytes": 0, "max_response_bytes": 0}
+		return entry
+
+	def begin(self, method):
+		with self._lock:
+			self._method(method)["in_flight"] += 1
+		return time.perf_counter()
+
+	def end(self, method, params, started, ok):
+		elapsed = time.perf_counter() - started
+		bucket = int(elapsed * 1e6).bit_length()
+		client = getattr(self.local, "client", None)
+		n = params[0] if params and type(params[0]) is int else None
+		with self._lock:
+			entry = self._method(method)
+			entry["in_flight"] -= 1
+			entry["calls"] += 1
+			entry["errors"] += not ok
+			entry["seconds"] += elapsed
+			entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+			entry["buckets"][bucket] = entry["buckets"].get(bucket, 0) + 1
+			if n is not None:
+				key = (method, max(n, 0).bit_length())
+				calls, seconds = self.n_ranges.get(key, (0, 0.0))
+				self.n_ranges[key] = (calls + 1, seconds + elapsed)
+			if client is not None and (client in self.clients or len(self.clients) < self.max_clients):
+				calls, seconds = self.clients.get(client, (0, 0.0))
+				self.clients[client] = (calls + 1, seconds + elapsed)
+
+	def record_payload(self, method, request_bytes, response_bytes):
+		with self._lock:
+			entry = self._method(method)
+			entry["request_bytes"] += request_bytes
+			entry["response_bytes"] += response_bytes
+			entry["max_response_bytes"] = max(entry["max_response_bytes"], response_bytes)
+
+	def snapshot(self):
+		# Totals are floats because XML-RPC <int> is only 32 bits
+		with self._lock:
+			methods = {name: dict(entry, buckets=dict(entry["buckets"])) for name, entry in self.methods.items()}
+			n_ranges = dict(self.n_ranges)
+			clients = dict(self.clients)
+		result = {"uptime_s": time.time() - self.started, "methods": {}, "n_ranges": {}, "clients": {}}
+		for name, entry in methods.items():
+			calls = entry["calls"]
+			result["methods"][name] = {
+				"calls": calls,
+				"errors": entry["errors"],
+				"in_flight": entry["in_flight"],
+				"mean_ms": 1000 * entry["seconds"] / calls if calls else 0.0,
+				"p50_ms": self._percentile(entry["buckets"], calls, 0.50),
+				"p95_ms": self._percentile(entry["buckets"], calls, 0.95),
+				"p99_ms": self._percentile(entry["buckets"], calls, 0.99),
+				"max_ms": 1000 * entry["max_seconds"],
+				"request_bytes": float(entry["request_bytes"]),
+				"response_bytes": float(entry["response_bytes"]),
+				"max_response_bytes": float(entry["max_response_bytes"]),
+			}
+		for (method, bits), (calls, seconds) in sorted(n_ranges.items()):
+			low = 1 << (bits - 1) if bits else 0
+			result["n_ranges"].setdefault(method, {})[f"{low}-{(1 << bits) - 1}"] = {"calls": calls, "total_ms": 1000 * seconds}
+		for client, (calls, seconds) in clients.items():
+			result["clients"][client] = {"calls": calls, "mean_ms": 1000 * seconds / calls}
+		return result
+
+	@staticmethod
+	def _percentile(buckets, count, q):
+		# Upper edge of the bucket holding the q-th call, in milliseconds
+		seen = 0
+		for bucket in sorted(buckets):
+			seen += buckets[bucket]
+			if seen >= q * count:
+				return (1 << bucket) / 1000
+		return 0.0
+
+class StatsDispatcherMixin:
+
+	# Mixed in before SimpleXMLRPCServer/SimpleXMLRPCDispatcher to time every
+	# dispatched method, including the calls inside system.multicall.
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.stats = RequestStats()
+
+	def _marshaled_dispatch(self, data, dispatch_method=None, path=None):
+		self.stats.local.method = None
+		response = super()._marshaled_dispatch(data, dispatch_method, path)
+		# No method is known when the body did not parse; XML-RPC struct
+		# keys must be strings, so count those under a placeholder name
+		self.stats.record_payload(self.stats.local.method or "<invalid>", len(data), len(response))
+		return response
+
+	def _marshaled_dispatch_from(self, client, data):
+		self.stats.local.client = client
+		return self._marshaled_dispatch(data)
+
+	def _dispatch(self, method, params):
+		if getattr(self.stats.local, "method", None) is None:
+			self.stats.local.method = method
+		started = self.stats.begin(method)
+		ok = False
+		try:
+			result = super()._dispatch(method, params)
+			ok = True
+			return result
+		finally:
+			self.stats.end(method, params, started, ok)
+
+	def register_stats_function(self):
+		self.register_function(self.stats.snapshot, "system.stats")
+
 		# Restrict to a particular path.
 class RequestHandler(SimpleXMLRPCRequestHandler):
 
 	rpc_paths = ('/RPC2',)
+
+	def do_POST(self):
+		stats = getattr(self.server, "stats", None)
+		if stats is not None:
+			stats.local.client = self.client_address[0]
+		super().do_POST()
+
+class InstrumentedXMLRPCServer(StatsDispatcherMixin, SimpleXMLRPCServer):
+
+	pass
+
+class ThreadingXMLRPCServer(ThreadingMixIn, InstrumentedXMLRPCServer):
+
+	daemon_threads = True
+	request_queue_size = 128
+
+def start_pool(workers, cache_bytes):
+	# Workers are forked lazily on the first submit; one forked after the
+	# server socket is bound inherits it and keeps the port open if it is
+	# orphaned, so start them all up front.
+	pool = ProcessPoolExecutor(max_workers=workers,
+		initializer=configure_cache, initargs=(cache_bytes,))
+	pool.submit(int).result()
+	return pool
+
+def raise_keyboard_interrupt(signum, frame):
+	# SIGTERM takes the same shutdown path as Ctrl-C
+	raise KeyboardInterrupt
+
+def parse_args():
+	parser = argparse.ArgumentParser(description="XML-RPC factorial server")
+	parser.add_argument("--host", default="localhost")
+	parser.add_argument("--port", type=int, default=8000)
+	parser.add_argument("--mode", choices=("simple", "threaded"), default="simple",
+		help="simple: one request at a time, threaded: thread per connection plus process pool")
+	parser.add_argument("--workers", type=int, default=os.cpu_count(),
+		help="process pool size used in threaded mode")
+	parser.add_argument("--inline-limit", type=int, default=1000,
+		help="largest n computed inline instead of in the process pool")
+	parser.add_argument("--max-pending", type=int, default=None,
+		help="pool jobs allowed at once before rejecting (default: 2 * workers)")
+	parser.add_argument("--gzip-threshold", type=int, default=1400,
+		help="gzip responses larger than this many bytes when the client accepts it (0 disables)")
+	parser.add_argument("--cache-bytes", type=int, default=64 * 1024 * 1024,
+		help="memory budget of the factorial checkpoint cache, per process")
+	return parser.parse_args()
+
+def main():
+	args = parse_args()
+	configure_cache(args.cache_bytes)
+	pool = None
+	server_class = InstrumentedXMLRPCServer
+	if args.mode == "threaded":
+		pool = start_pool(args.workers, args.cache_bytes)
+		server_class = ThreadingXMLRPCServer
+	max_pending = args.max_pending or 2 * args.workers
+	RequestHandler.encode_threshold = args.gzip_threshold or None
+	signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
 		# Create server
-with SimpleXMLRPCServer(('localhost', 8000),
-requestHandler=RequestHandler) as server:
-	server.register_introspection_functions()
+	with server_class((args.host, args.port),
+	requestHandler=RequestHandler) as server:
+		server.register_introspection_functions()
+		server.register_multicall_functions()
+		server.register_stats_function()
 		# Register the FactorialServer class
-	server.register_instance(FactorialServer())
-	print("FactorialServer is ready to accept requests.")
+		server.register_instance(FactorialServer(pool, args.inline_limit, max_pending))
+		print(f"FactorialServer ({args.mode}) is ready to accept requests.")
 		# Run the server's main loop
-	server.serve_forever()
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			if pool is not None:
+				pool.shutdown(cancel_futures=True)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,162 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import Pyro4
+
+from CL3_2_Client import concatenate_batched
+from CL3_2_Client import concatenate_large
+from CL3_2_Client import concatenate_chunked
+from CL3_2_Client import concatenate_one_by_one
+from CL3_2_Client import concatenate_pipelined
+from CL3_2_Client import use_serializer
+from Server import SERIALIZERS
+from Server import StringConcatenationServer
+from Server import configure
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def start_daemon():
+    # Local daemon in a background thread, no nameserver needed
+    configure()
+    daemon = Pyro4.Daemon()
+    uri = daemon.register(StringConcatenationServer())
+    thread = threading.Thread(target=daemon.requestLoop, daemon=True)
+    thread.start()
+    return daemon, uri
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def start_server_process(servertype, threads):
+    # Server.py in its own process so the server and the clients do not
+    # share a GIL; returns the process and the URI it wrote.
+    fd, uri_file = tempfile.mkstemp(suffix=".uri")
+    os.close(fd)
+    cmd = [sys.executable, "Server.py", "--no-nameserver", "--uri-file", uri_file, "--servertype", servertype]
+    if threads:
+        cmd += ["--threads", str(threads)]
+    process = subprocess.Popen(cmd, cwd=HERE, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    try:
+        while time.monotonic() < deadline and process.poll() is None:
+            with open(uri_file) as f:
+                uri = f.read()
+            if uri.startswith("PYRO:"):
+                return process, uri
+            time.sleep(0.05)
+    finally:
+        os.remove(uri_file)
+    process.kill()
+    raise RuntimeError(f"server did not start: {' '.join(cmd)}")
+
+def drive(uri, clients, duration):
+    # Each client thread owns one proxy (one connection) and calls in a loop
+    counts = [0] * clients
+    errors = [0] * clients
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        with Pyro4.Proxy(uri) as server:
+            while time.perf_counter() < deadline:
+                try:
+                    server.concatenate_strings("left", "right")
+                    counts[index] += 1
+                except Pyro4.errors.PyroError:
+                    errors[index] += 1
+                    server._pyroRelease()
+                    time.sleep(0.01)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts), sum(errors), time.perf_counter() - start
+
+def scaling(settings, client_counts, duration):
+    print(f"{'setting':>12} {'clients':>8} {'calls/s':>10} {'errors':>7}")
+    for setting in settings:
+        servertype, _, threads = setting.partition(":")
+        process, uri = start_server_process(servertype, int(threads) if threads else None)
+        try:
+            for clients in client_counts:
+                calls, errors, elapsed = drive(uri, clients, duration)
+                print(f"{setting:>12} {clients:>8} {calls / elapsed:>10.0f} {errors:>7}")
+        finally:
+            process.terminate()
+            process.wait()
+
+def large_payloads(uri, megabytes, chunk_size):
+    half = megabytes * 1024 * 1024 // 2
+    data1, data2 = os.urandom(half), os.urandom(half)
+    expected = data1 + data2
+    for serializer in SERIALIZERS:
+        if serializer == "json":
+            continue
+        try:
+            with use_serializer(Pyro4.Proxy(uri), serializer) as server:
+                result, elapsed = timed(concatenate_large, server, data1, data2, chunk_size)
+        except Pyro4.errors.SerializeError as e:
+            print(f"{serializer:>8}: skipped ({e})")
+            continue
+        if result != expected:
+            raise RuntimeError(f"{serializer} returned wrong bytes")
+        print(f"{serializer:>8}: {megabytes} MB in {elapsed:.3f}s ({megabytes / elapsed:.1f} MB/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Calls per second of the concatenation service")
+    parser.add_argument("--pairs", type=int, default=20000)
+    parser.add_argument("--single", type=int, default=2000,
+                        help="pairs sent through the one-at-a-time path (it is slow)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--large", type=int, default=None, metavar="MB",
+                        help="concatenate two random blobs totalling MB megabytes with each serializer instead")
+    parser.add_argument("--upload-chunk", type=int, default=4 * 1024 * 1024,
+                        help="chunk size in bytes for --large")
+    parser.add_argument("--scaling", action="store_true",
+                        help="measure calls/s against client count for each server setting instead")
+    parser.add_argument("--settings", default="multiplex,thread:8,thread:64",
+                        help="comma separated servertype[:threads] values for --scaling")
+    parser.add_argument("--clients", default="1,4,16,32",
+                        help="comma separated client counts for --scaling")
+    parser.add_argument("--duration", type=float, default=2.0,
+                        help="seconds per measurement for --scaling")
+    args = parser.parse_args()
+
+    if args.scaling:
+        scaling(args.settings.split(","), [int(c) for c in args.clients.split(",")], args.duration)
+        return
+
+    daemon, uri = start_daemon()
+    if args.large:
+        large_payloads(uri, args.large, args.upload_chunk)
+        daemon.shutdown()
+        return
+    pairs = [(f"left{i}", f"right{i}") for i in range(args.pairs)]
+    expected = [a + b for a, b in pairs]
+
+    with Pyro4.Proxy(uri) as server:
+        runs = [
+            ("one at a time", concatenate_one_by_one, pairs[:args.single]),
+            ("batch proxy", concatenate_batched, pairs),
+            ("concatenate_many", lambda s, p: concatenate_chunked(s, p, args.chunk_size), pairs),
+            ("async fan-out", lambda s, p: concatenate_pipelined(s, p, args.chunk_size), pairs),
+        ]
+        for name, func, data in runs:
+            result, elapsed = timed(func, server, data)
+            if result != expected[:len(data)]:
+                raise RuntimeError(f"{name} returned wrong results")
+            print(f"{name:>17}: {len(data)} concatenations in {elapsed:.3f}s ({len(data) / elapsed:.0f} calls/s)")
+
+    daemon.shutdown()
+
+if __name__ == "__main__":
+    main()
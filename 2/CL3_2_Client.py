@@ -1,11 +1,116 @@
+import collections
+import sys
+
 import Pyro4
 
+from CL3_2_ClientPool import resolve
+from Server import as_bytes
+
+# Payloads above this size are sent with the chunked upload calls
+CHUNK_SIZE = 4 * 1024 * 1024
+
+def concatenate_one_by_one(server, pairs):
+    return [server.concatenate_strings(str1, str2) for str1, str2 in pairs]
+
+def concatenate_batched(server, pairs):
+    # Pyro4 batch proxy: all queued calls travel in a single request
+    batch = Pyro4.batch(server)
+    for str1, str2 in pairs:
+        batch.concatenate_strings(str1, str2)
+    return list(batch())
+
+def concatenate_chunked(server, pairs, chunk_size=1000):
+    # One concatenate_many call per chunk
+    results = []
+    for start in range(0, len(pairs), chunk_size):
+        results.extend(server.concatenate_many(pairs[start:start + chunk_size]))
+    return results
+
+def concatenate_pipelined(server, pairs, chunk_size=1000, window=8):
+    # Async proxy: Pyro4 copies the proxy for every async call, so each
+    # chunk in flight has its own thread and connection. This is a fan-out
+    # over at most `window` parallel connections, not one pipelined socket.
+    async_server = Pyro4.Proxy(server._pyroUri)
+    async_server._pyroAsync()
+    pending = collections.deque()
+    results = []
+    try:
+        for start in range(0, len(pairs), chunk_size):
+            if len(pending) >= window:
+                results.extend(pending.popleft().value)
+            pending.append(async_server.concatenate_many(pairs[start:start + chunk_size]))
+        while pending:
+            results.extend(pending.popleft().value)
+        return results
+    finally:
+        async_server._pyroRelease()
+
+def use_serializer(server, serializer):
+    # "marshal" or "msgpack" send bytes as-is; the default serpent
+    # base64-encodes them
+    server._pyroSerializer = serializer
+    return server
+
+def upload(server, data, chunk_size=CHUNK_SIZE):
+    # data may be bytes, bytearray or any buffer such as a memoryview
+    view = memoryview(data).cast("B")
+    upload_id = server.start_upload()
+    try:
+        for start in range(0, len(view), chunk_size):
+            server.upload_chunk(upload_id, bytes(view[start:start + chunk_size]))
+    except Exception:
+        server.abort_upload(upload_id)
+        raise
+    return upload_id
+
+def concatenate_large(server, data1, data2, chunk_size=CHUNK_SIZE):
+    # bytes() does not copy objects that already are bytes
+    if len(data1) + len(data2) <= chunk_size:
+        return as_bytes(server.concatenate_strings(bytes(data1), bytes(data2)))
+    first = upload(server, data1, chunk_size)
+    try:
+        second = upload(server, data2, chunk_size)
+    except Exception:
+        server.abort_upload(first)
+        raise
+    return as_bytes(server.concatenate_uploads(first, second))
+
+def concatenate_streamed(server, parts, piece_size=65536):
+    # Pieces arrive one remote iterator step at a time
+    for piece in server.concatenate_stream(parts, piece_size):
+        yield as_bytes(piece)
+
+def concatenate_large_to_file(server, blobs, path, chunk_size=CHUNK_SIZE):
+    # Upload every blob in chunks, then stream the result straight to disk
+    upload_ids = []
+    try:
+        for blob in blobs:
+            upload_ids.append(upload(server, blob, chunk_size))
+    except Exception:
+        for upload_id in upload_ids:
+            server.abort_upload(upload_id)
+        raise
+    written = 0
+    with open(path, "wb") as f:
+        for piece in server.concatenate_uploads_stream(upload_ids, chunk_size):
+            written += f.write(as_bytes(piece))
+    return written
+
+def read_pairs(path):
+    # One pair per line, the two strings separated by a tab
+    with open(path, "r") as f:
+        return [tuple(line.rstrip("\n").split("\t", 1)) for line in f if "\t" in line]
+
 def main():
-    with open("server_uri.txt", "r") as f:
-        uri = f.read()
+    uri = resolve() # Nameserver lookup, cached, falling back to server_uri.txt
 
     server = Pyro4.Proxy(uri) # Connect to the remote server
 
+    if len(sys.argv) > 1:
+        for result in concatenate_chunked(server, read_pairs(sys.argv[1])):
+            print(result)
+        return
+
     str1 = input("Enter the first string: ")
     str2 = input("Enter the second string: ")
 
@@ -14,4 +119,4 @@ def main():
     print("Concatenated Result:", result)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,179 @@
+import contextlib
+import itertools
+import os
+import queue
+import threading
+import time
+
+import Pyro4
+
+from Server import NAME
+
+_resolved = {}
+_resolved_lock = threading.Lock()
+
+def resolve(name=NAME, uri_file="server_uri.txt", ttl=60.0, cache_file="server_uri.cache"):
+    # Lookup order: in-process cache, on-disk cache (younger than ttl, so
+    # short-lived processes skip the nameserver too), nameserver, URI file.
+    # The disk cache holds the name on its first line and the URI on the
+    # second, and only counts for that name.
+    now = time.monotonic()
+    with _resolved_lock:
+        cached = _resolved.get(name)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    uri = None
+    if cache_file:
+        try:
+            if time.time() - os.path.getmtime(cache_file) < ttl:
+                with open(cache_file, "r") as f:
+                    cached_name, _, cached_uri = f.read().partition("\n")
+                if cached_name == name:
+                    uri = cached_uri.strip() or None
+        except OSError:
+            pass
+    if uri is None:
+        try:
+            with Pyro4.locateNS() as ns:
+                uri = str(ns.lookup(name))
+        except Pyro4.errors.PyroError:
+            with open(uri_file, "r") as f:
+                uri = f.read().strip()
+        if cache_file:
+            with contextlib.suppress(OSError), open(cache_file, "w") as f:
+                f.write(f"{name}\n{uri}")
+
+    with _resolved_lock:
+        _resolved[name] = (uri, now + ttl)
+    return uri
+
+def invalidate(name=NAME, cache_file="server_uri.cache"):
+    with _resolved_lock:
+        _resolved.pop(name, None)
+    if cache_file:
+        with contextlib.suppress(OSError):
+            os.remove(cache_file)
+
+class ProxyPool:
+
+    def __init__(self, name=NAME, size=8, uri_file="server_uri.txt", ttl=60.0, cache_file="server_uri.cache", uri=None):
+        # Up to `size` connected proxies; each is handed to one thread at a
+        # time, which is what makes sharing the pool between threads safe.
+        # With uri set, the pool connects there instead of resolving name.
+        self.uri = uri
+        self.name = name
+        self.size = size
+        self.uri_file = uri_file
+        self.ttl = ttl
+        self.cache_file = cache_file
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        proxy = Pyro4.Proxy(self.uri or resolve(self.name, self.uri_file, self.ttl, self.cache_file))
+        proxy._pyroBind()
+        return proxy
+
+    @contextlib.contextmanager
+    def proxy(self):
+        self._slots.acquire()
+        try:
+            try:
+                proxy = self._idle.get_nowait()
+            except queue.Empty:
+                proxy = self._connect()
+            # Only a communication error means the connection is broken;
+            # after anything else (a remote exception, say) it is reused
+            broken = False
+            try:
+                yield proxy
+            except Pyro4.errors.CommunicationError:
+                broken = True
+                proxy._pyroRelease()
+                raise
+            finally:
+                if not broken:
+                    self._idle.put(proxy)
+        finally:
+            self._slots.release()
+
+    def call(self, method, *args):
+        # A dead server (or a stale cached URI) gets one retry after
+        # resolving the name again.
+        for attempt in range(2):
+            try:
+                with self.proxy() as proxy:
+                    return getattr(proxy, method)(*args)
+            except Pyro4.errors.CommunicationError:
+                if attempt:
+                    raise
+                invalidate(self.name, self.cache_file)
+                self.clear()
+
+    def clear(self):
+        while True:
+            try:
+                self._idle.get_nowait()._pyroRelease()
+            except queue.Empty:
+                return
+
+class ReplicaPool:
+
+    def __init__(self, prefix=NAME, size=4, ttl=30.0):
+        # Every nameserver entry starting with prefix is a replica; calls
+        # rotate over them and move on to the next one when a replica is down.
+        self.prefix = prefix
+        self.size = size
+        self.ttl = ttl
+        self._pools = {}
+        self._live = []
+        self._expires = 0.0
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def _replicas(self):
+        with self._lock:
+            if self._live and self._expires > time.monotonic():
+                return self._live
+        with Pyro4.locateNS() as ns:
+            listing = ns.list(prefix=self.prefix)
+        with self._lock:
+            for name in set(self._pools) - set(listing):
+                self._pools.pop(name).clear()
+            for name, uri in listing.items():
+                pool = self._pools.get(name)
+                if pool is None or pool.uri != uri:
+                    self._pools[name] = ProxyPool(name, self.size, uri=uri)
+            self._live = sorted(self._pools.items())
+            self._expires = time.monotonic() + self.ttl
+            return self._live
+
+    def _mark_dead(self, name):
+        with self._lock:
+            self._live = [(n, pool) for n, pool in self._live if n != name]
+
+    def call(self, method, *args):
+        replicas = self._replicas()
+        if not replicas:
+            raise Pyro4.errors.NamingError(f"no replicas registered under {self.prefix}")
+        start = next(self._counter)
+        for i in range(len(replicas)):
+            name, pool = replicas[(start + i) % len(replicas)]
+            try:
+                with pool.proxy() as proxy:
+                    return getattr(proxy, method)(*args)
+            except Pyro4.errors.CommunicationError:
+                self._mark_dead(name)
+        raise Pyro4.errors.CommunicationError(f"all replicas under {self.prefix} failed")
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(name=NAME, size=8):
+    # Process-wide pool per name, for callers that cannot keep one around
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ProxyPool(name, size)
+        return pool
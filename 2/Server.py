@@ -1,28 +1,217 @@
+import argparse
+import multiprocessing
+import signal
+import threading
+import time
+import uuid
+
 import Pyro4
+import serpent
+
+# Nameserver name; replicas register as NAME.0, NAME.1, ... so clients
+# can find all of them with a prefix listing
+NAME = "string.concatenation"
+
+# Serializers the daemon accepts; the client picks one per proxy.
+# marshal and msgpack carry bytes natively, serpent base64-encodes them.
+SERIALIZERS = ("serpent", "marshal", "json", "msgpack")
+
+# Uploads untouched for this many seconds are dropped, so a client that dies
+# mid-upload does not pin its buffer; at most MAX_UPLOADS are open at once
+UPLOAD_IDLE_TIMEOUT = 300.0
+MAX_UPLOADS = 64
+
+def as_bytes(value):
+    # serpent delivers bytes as {"data": <base64>, "encoding": "base64"}
+    if isinstance(value, dict) and value.get("encoding") == "base64":
+        return serpent.tobytes(value)
+    return value
+
 @Pyro4.expose
 class StringConcatenationServer:
+    def __init__(self, upload_idle_timeout=UPLOAD_IDLE_TIMEOUT, max_uploads=MAX_UPLOADS):
+        # upload id -> [buffer, monotonic time of last use]
+        self._uploads = {}
+        self._uploads_lock = threading.Lock()
+        self.upload_idle_timeout = upload_idle_timeout
+        self.max_uploads = max_uploads
+
     def concatenate_strings(self, str1, str2):
-        result = str1 + str2
+        # str + str gives str; bytes/bytearray inputs give bytes/bytearray
+        result = as_bytes(str1) + as_bytes(str2)
         return result
 
-def main():
-    daemon = Pyro4.Daemon() # Create a Pyro daemon
-    ns = Pyro4.locateNS() # Locate the Pyro nameserver
+    def concatenate_many(self, pairs):
+        # One remote call for a whole list of (str1, str2) pairs
+        return [as_bytes(str1) + as_bytes(str2) for str1, str2 in pairs]
+
+    # Chunked upload for payloads too big for one message: chunks are
+    # appended in place to a bytearray per upload.
+    def start_upload(self):
+        upload_id = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._uploads_lock:
+            expired = [key for key, (_, used) in self._uploads.items() if now - used > self.upload_idle_timeout]
+            for key in expired:
+                del self._uploads[key]
+            if len(self._uploads) >= self.max_uploads:
+                raise RuntimeError(f"Too many open uploads ({self.max_uploads}), finish or abort one first")
+            self._uploads[upload_id] = [bytearray(), now]
+        return upload_id
+
+    def _upload(self, upload_id, pop=False):
+        try:
+            entry = self._uploads.pop(upload_id) if pop else self._uploads[upload_id]
+        except KeyError:
+            raise KeyError(f"Unknown or expired upload {upload_id}") from None
+        entry[1] = time.monotonic()
+        return entry[0]
+
+    def upload_chunk(self, upload_id, chunk):
+        with self._uploads_lock:
+            buffer = self._upload(upload_id)
+        buffer += as_bytes(chunk)
+        return len(buffer)
+
+    def abort_upload(self, upload_id):
+        with self._uploads_lock:
+            self._uploads.pop(upload_id, None)
+
+    def concatenate_uploads(self, first_id, second_id):
+        with self._uploads_lock:
+            first = self._upload(first_id, pop=True)
+            second = self._upload(second_id, pop=True)
+        first += second
+        return first
+
+    # Generators are returned to the client as Pyro4 remote iterators, so the
+    # joined result only ever exists one piece at a time on either side.
+    def concatenate_stream(self, parts, piece_size=65536):
+        return pieces([as_bytes(part) for part in parts], piece_size)
+
+    def concatenate_uploads_stream(self, upload_ids, piece_size=65536):
+        with self._uploads_lock:
+            buffers = [self._upload(upload_id, pop=True) for upload_id in upload_ids]
+        return pieces(buffers, piece_size)
+
+def pieces(parts, piece_size):
+    # Yield the concatenation of parts (all str or all bytes-like) in
+    # piece_size chunks; bytes are sliced through memoryviews so the only
+    # copy is the join into each outgoing piece.
+    if piece_size < 1:
+        raise ValueError("piece_size must be positive")
+    pending = []
+    size = 0
+    joiner = ""
+    for part in parts:
+        if isinstance(part, str):
+            joiner = ""
+        else:
+            joiner = b""
+            part = memoryview(part).cast("B")
+        start = 0
+        while start < len(part):
+            take = min(piece_size - size, len(part) - start)
+            pending.append(part[start:start + take])
+            size += take
+            start += take
+            if size == piece_size:
+                yield joiner.join(pending)
+                pending = []
+                size = 0
+    if pending:
+        yield joiner.join(pending)
+
+def configure(servertype=None, threads=None, threads_min=None, serializers=SERIALIZERS):
+    # Must run before the Daemon is created; PYRO_SERVERTYPE and
+    # PYRO_THREADPOOL_SIZE in the environment are honoured as well.
+    Pyro4.config.SERIALIZERS_ACCEPTED = set(serializers)
+    if servertype:
+        Pyro4.config.SERVERTYPE = servertype
+    if threads:
+        Pyro4.config.THREADPOOL_SIZE = threads
+    if threads_min:
+        Pyro4.config.THREADPOOL_SIZE_MIN = threads_min
+    Pyro4.config.THREADPOOL_SIZE_MIN = min(Pyro4.config.THREADPOOL_SIZE_MIN, Pyro4.config.THREADPOOL_SIZE)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pyro4 string concatenation server")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--servertype", choices=("thread", "multiplex"), default=None,
+                        help="thread: pool of worker threads, one per connection; multiplex: single thread with select()")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="maximum worker threads, i.e. concurrent client connections (thread server)")
+    parser.add_argument("--threads-min", type=int, default=None,
+                        help="worker threads kept alive when idle (thread server)")
+    parser.add_argument("--serializers", default=",".join(SERIALIZERS),
+                        help="comma separated serializers clients may use")
+    parser.add_argument("--no-nameserver", action="store_true",
+                        help="only write the URI file, do not register with the nameserver")
+    parser.add_argument("--uri-file", default="server_uri.txt")
+    parser.add_argument("--replicas", type=int, default=0,
+                        help=f"start this many server processes registered as {NAME}.<i>")
+    parser.add_argument("--upload-timeout", type=float, default=UPLOAD_IDLE_TIMEOUT,
+                        help="seconds an unfinished upload may sit idle before it is dropped")
+    parser.add_argument("--max-uploads", type=int, default=MAX_UPLOADS,
+                        help="uploads that may be open at once")
+    return parser.parse_args()
+
+def serve(args, name=NAME, port=0, uri_file=None):
+    configure(args.servertype, args.threads, args.threads_min, args.serializers.split(","))
+    daemon = Pyro4.Daemon(host=args.host, port=port) # Create a Pyro daemon
 
 # Create an instance of the server class
-    server = StringConcatenationServer()
+    server = StringConcatenationServer(args.upload_timeout, args.max_uploads)
 
 # Register the server object with the Pyro nameserver
     uri = daemon.register(server)
-    ns.register("string.concatenation", uri)
+    if not args.no_nameserver:
+        with Pyro4.locateNS() as ns: # Locate the Pyro nameserver
+            ns.register(name, uri)
+
+    print(f"Server URI ({name}):", uri)
+    print(f"Server type: {Pyro4.config.SERVERTYPE}, thread pool: {Pyro4.config.THREADPOOL_SIZE_MIN}-{Pyro4.config.THREADPOOL_SIZE}")
 
-    print("Server URI:", uri)
+    if uri_file:
+        with open(uri_file, "w") as f:
+            f.write(str(uri))
 
-    with open("server_uri.txt", "w") as f:
-        f.write(str(uri))
-    
+    # Treat SIGTERM like Ctrl-C so the nameserver entry is removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        daemon.requestLoop()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if not args.no_nameserver:
+            with Pyro4.locateNS() as ns:
+                ns.remove(name)
+        daemon.close()
+
+def main():
+    args = parse_args()
+    if not args.replicas:
+        serve(args, NAME, args.port, args.uri_file)
+        return
 
-    daemon.requestLoop()
+    # One process per replica so the service can use more than one core
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    replicas = []
+    for i in range(args.replicas):
+        port = args.port + i if args.port else 0
+        uri_file = args.uri_file if i == 0 else None
+        process = multiprocessing.Process(target=serve, args=(args, f"{NAME}.{i}", port, uri_file))
+        process.start()
+        replicas.append(process)
+    try:
+        for process in replicas:
+            process.join()
+    except KeyboardInterrupt:
+        for process in replicas:
+            process.terminate()
+        for process in replicas:
+            process.join()
 
 if __name__ == "__main__":
     main()
@@ -1,3 +1,15 @@
+import contextlib
+import itertools
+import math
+import os
+import pickle
+import tempfile
+import weakref
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
 class FuzzySet:
     def __init__(self, elements):
         self.elements = elements  
@@ -22,16 +34,958 @@ class FuzzyRelation:
         self.relation = {(x, y): min(set1.elements[x], set2.elements[y]) for x in set1.elements for y in set2.elements}
     
     def max_min_composition(self, other):
-        result = {}
-        for (a, b) in self.relation:
-            for (c, d) in other.relation:
-                if b == c:
-                    result[(a, d)] = max(result.get((a, d), 0), min(self.relation[(a, b)], other.relation[(c, d)]))
-        return result
+        # Done on dense matrices; pairs (a, d) with no shared middle element
+        # are left out, as in the pairwise definition.
+        left, right = self.to_matrix(), other.to_matrix()
+        composed = left.compose(right, "min")
+        if len(self) == left.matrix.size and len(other) == right.matrix.size:
+            # Every pair defined on both sides: all (a, d) are linked as soon
+            # as the two middle universes share an element
+            linked = np.full(composed.matrix.shape, any(y in right.rows for y in left.cols.elements))
+        else:
+            linked = self._presence(left).matrix @ left._aligned(other._presence(right)) > 0
+        rows, cols = np.nonzero(linked)
+        return {(composed.rows.elements[i], composed.cols.elements[k]): v
+                for i, k, v in zip(rows.tolist(), cols.tolist(), composed.matrix[rows, cols].tolist())}
+
+    def to_matrix(self, rows=None, cols=None):
+        if rows is None:
+            rows = Universe(dict.fromkeys(x for x, _ in self.relation))
+        if cols is None:
+            cols = Universe(dict.fromkeys(y for _, y in self.relation))
+        matrix = np.zeros((len(rows), len(cols)))
+        if self.relation:
+            i = np.fromiter((rows.index[x] for x, _ in self.relation), dtype=np.intp, count=len(self.relation))
+            k = np.fromiter((cols.index[y] for _, y in self.relation), dtype=np.intp, count=len(self.relation))
+            matrix[i, k] = np.fromiter(self.relation.values(), dtype=float, count=len(self.relation))
+        return MatrixFuzzyRelation(rows, cols, matrix)
+
+    def transitive_closure(self, method="auto"):
+        # Max-min transitive closure over all elements appearing in the
+        # relation, computed on the matrix backend
+        universe = Universe(dict.fromkeys(x for pair in self.relation for x in pair))
+        return self.to_matrix(universe, universe).transitive_closure(method=method).to_relation()
+
+    def save(self, path):
+        # Pairs missing from the dict are 0 in the matrix; unless every pair
+        # is defined, the flat positions of the defined ones are kept too
+        matrix = self.to_matrix()
+        matrix.save(path)
+        if len(self) != matrix.matrix.size:
+            np.save(os.path.join(path, PAIRS_FILE), np.flatnonzero(self._presence(matrix).matrix))
+
+    @classmethod
+    def load(cls, path):
+        matrix = MatrixFuzzyRelation.load(path)
+        try:
+            positions = np.load(os.path.join(path, PAIRS_FILE))
+        except FileNotFoundError:
+            return matrix.to_relation()
+        rows, cols = np.divmod(positions, len(matrix.cols))
+        relation = FuzzyRelation.__new__(FuzzyRelation)
+        relation.relation = {(matrix.rows.elements[i], matrix.cols.elements[k]): v
+                             for i, k, v in zip(rows.tolist(), cols.tolist(), matrix.matrix[rows, cols].tolist())}
+        return relation
+
+    def _presence(self, matrix_relation):
+        # 1 where a pair is defined (even with membership 0), else 0
+        presence = np.zeros(matrix_relation.matrix.shape)
+        if len(self) == presence.size:
+            presence[:] = 1
+        else:
+            for x, y in self.relation:
+                presence[matrix_relation.rows.index[x], matrix_relation.cols.index[y]] = 1
+        return MatrixFuzzyRelation(matrix_relation.rows, matrix_relation.cols, presence)
+
+    def __len__(self):
+        return len(self.relation)
     
     def __repr__(self):
         return str(self.relation)
 
+class _WatchedDict(dict):
+    # dict that calls on_change before any in-place modification
+    def __init__(self, items, on_change):
+        super().__init__(items)
+        self._on_change = on_change
+
+    def __setitem__(self, key, value):
+        self._on_change()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._on_change()
+        super().__delitem__(key)
+
+    def __ior__(self, other):
+        self._on_change()
+        return super().__ior__(other)
+
+    def update(self, *args, **kwargs):
+        self._on_change()
+        super().update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._on_change()
+        return super().setdefault(key, default)
+
+    def pop(self, *args):
+        self._on_change()
+        return super().pop(*args)
+
+    def popitem(self):
+        self._on_change()
+        return super().popitem()
+
+    def clear(self):
+        self._on_change()
+        super().clear()
+
+class CylindricalRelation(FuzzyRelation, Mapping):
+    # The relation FuzzyRelation(set1, set2) builds, min(A(x), B(y)), kept as
+    # its two generating sets with entries computed on demand. Reading
+    # .relation builds the dict once but keeps the relation lazy; writing to
+    # that dict, assigning an entry or replacing .relation marks it
+    # modified, after which it behaves like a plain FuzzyRelation. It is
+    # also a read-only Mapping of pairs to memberships, so it can stand in
+    # for the dict that max_min_composition returns for other relations.
+    def __init__(self, set1, set2):
+        self.set1 = set1
+        self.set2 = set2
+        self._relation = None
+        self._modified = False
+
+    @property
+    def relation(self):
+        if self._relation is None:
+            self._relation = _WatchedDict(self._pairs(), self._mark_modified)
+        return self._relation
+
+    @relation.setter
+    def relation(self, relation):
+        self._relation = relation
+        self._modified = True
+
+    def _mark_modified(self):
+        self._modified = True
+
+    @property
+    def is_lazy(self):
+        # Still exactly min(A(x), B(y)), so the closed forms apply
+        return not self._modified
+
+    def _pairs(self):
+        return {(x, y): min(a, b) for x, a in self.set1.elements.items() for y, b in self.set2.elements.items()}
+
+    def __getitem__(self, pair):
+        if self._modified:
+            return self._relation[pair]
+        return min(self.set1.elements[pair[0]], self.set2.elements[pair[1]])
+
+    def __setitem__(self, pair, value):
+        self.relation[pair] = value
+
+    def __iter__(self):
+        if self._modified:
+            return iter(self._relation)
+        return itertools.product(self.set1.elements, self.set2.elements)
+
+    def __len__(self):
+        if self._modified:
+            return len(self._relation)
+        return len(self.set1.elements) * len(self.set2.elements)
+
+    def to_matrix(self, rows=None, cols=None):
+        if self._modified or rows is not None or cols is not None:
+            return super().to_matrix(rows, cols)
+        return MatrixFuzzyRelation.from_sets(self.set1, self.set2)
+
+    def max_min_composition(self, other):
+        # max_y min(A(x), B(y), C(y), D(z)) = min(min(A(x), h), D(z)) with
+        # h = max_y min(B(y), C(y)), so the result is again cylindrical and
+        # costs O(|X| + |Y| + |Z|). Anything else uses the general engine.
+        if not (self.is_lazy and isinstance(other, CylindricalRelation) and other.is_lazy):
+            return super().max_min_composition(other)
+        shared = self.set2.elements.keys() & other.set1.elements.keys()
+        if not shared:
+            return CylindricalRelation(FuzzySet({}), FuzzySet({}))
+        height = max(min(self.set2.elements[y], other.set1.elements[y]) for y in shared)
+        return CylindricalRelation(FuzzySet({x: min(a, height) for x, a in self.set1.elements.items()}), other.set2)
+
+    def __repr__(self):
+        return str(self._relation if self._relation is not None else self._pairs())
+
+class Universe:
+    # Fixed, ordered set of elements shared by ArrayFuzzySets; maps each
+    # element to its position in the membership arrays.
+    def __init__(self, elements):
+        self.elements = list(elements)
+        self.index = {x: i for i, x in enumerate(self.elements)}
+        if len(self.index) != len(self.elements):
+            raise ValueError("Universe elements must be unique")
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __contains__(self, x):
+        return x in self.index
+
+    def array(self, elements):
+        # dict of memberships -> float array over the universe, 0 where absent
+        memberships = np.zeros(len(self.elements))
+        if elements:
+            positions = np.fromiter((self.index[x] for x in elements), dtype=np.intp, count=len(elements))
+            memberships[positions] = np.fromiter(elements.values(), dtype=float, count=len(elements))
+        return memberships
+
+    def __repr__(self):
+        return f"Universe({len(self.elements)} elements)"
+
+class ArrayFuzzySet:
+    # Memberships held in a float array indexed by a Universe. Every element
+    # of the universe has a membership (0 if absent), so complement and
+    # difference range over the whole universe, not only the support.
+    def __init__(self, universe, memberships):
+        self.universe = universe
+        self.memberships = np.asarray(memberships, dtype=float)
+        if self.memberships.shape != (len(universe),):
+            raise ValueError("Memberships must have one value per universe element")
+
+    @classmethod
+    def from_dict(cls, elements, universe=None):
+        if universe is None:
+            universe = Universe(elements)
+        return cls(universe, universe.array(elements))
+
+    @classmethod
+    def from_fuzzy_set(cls, fuzzy_set, universe=None):
+        return cls.from_dict(fuzzy_set.elements, universe)
+
+    def to_dict(self, drop_zeros=False):
+        if drop_zeros:
+            nonzero = np.flatnonzero(self.memberships)
+            return {self.universe.elements[i]: v for i, v in zip(nonzero.tolist(), self.memberships[nonzero].tolist())}
+        return dict(zip(self.universe.elements, self.memberships.tolist()))
+
+    def to_fuzzy_set(self, drop_zeros=False):
+        return FuzzySet(self.to_dict(drop_zeros))
+
+    def _check(self, other):
+        if other.universe is not self.universe:
+            raise ValueError("Fuzzy sets must share the same Universe")
+
+    def union(self, other):
+        self._check(other)
+        return ArrayFuzzySet(self.universe, np.maximum(self.memberships, other.memberships))
+
+    def intersection(self, other):
+        self._check(other)
+        return ArrayFuzzySet(self.universe, np.minimum(self.memberships, other.memberships))
+
+    def complement(self):
+        return ArrayFuzzySet(self.universe, 1 - self.memberships)
+
+    def difference(self, other):
+        self._check(other)
+        return ArrayFuzzySet(self.universe, np.minimum(self.memberships, 1 - other.memberships))
+
+    def __getitem__(self, x):
+        return float(self.memberships[self.universe.index[x]])
+
+    def lazy(self):
+        return LazyFuzzySet.leaf(self)
+
+    def __repr__(self):
+        return str(self.to_dict())
+
+# Live LazyFuzzySet nodes by (op, operand ids), so equal subexpressions are
+# built once and evaluated once
+_lazy_nodes = weakref.WeakValueDictionary()
+
+class LazyFuzzySet:
+    # Expression tree over ArrayFuzzySets of one Universe. Operations only
+    # build nodes; reading memberships (or anything derived from them)
+    # evaluates the whole tree in one chunked pass and keeps only the result.
+    # Operand sets must not be modified in place once used.
+    chunk_size = 65536
+
+    def __init__(self, universe, op, operands=(), memberships=None, source=None):
+        self.universe = universe
+        self.op = op
+        self.operands = operands
+        self.source = source
+        self._memberships = memberships
+
+    @classmethod
+    def leaf(cls, array_set):
+        key = ("leaf", id(array_set))
+        node = _lazy_nodes.get(key)
+        if node is None:
+            node = _lazy_nodes[key] = cls(array_set.universe, "leaf", memberships=array_set.memberships, source=array_set)
+        return node
+
+    def _node(self, op, *operands):
+        operands = tuple(o if isinstance(o, LazyFuzzySet) else o.lazy() for o in (self,) + operands)
+        if any(o.universe is not self.universe for o in operands):
+            raise ValueError("Fuzzy sets must share the same Universe")
+        if op in ("union", "intersection"):
+            operands = tuple(sorted(operands, key=id))
+        key = (op,) + tuple(id(o) for o in operands)
+        node = _lazy_nodes.get(key)
+        if node is None:
+            node = _lazy_nodes[key] = LazyFuzzySet(self.universe, op, operands)
+        return node
+
+    def union(self, other):
+        return self._node("union", other)
+
+    def intersection(self, other):
+        return self._node("intersection", other)
+
+    def complement(self):
+        return self._node("complement")
+
+    def difference(self, other):
+        return self._node("difference", other)
+
+    def _pending(self):
+        # Unevaluated nodes below and including self, operands first
+        order, seen, stack = [], set(), [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node._memberships is not None or id(node) in seen:
+                continue
+            if expanded:
+                seen.add(id(node))
+                order.append(node)
+            else:
+                stack.append((node, True))
+                stack.extend((operand, False) for operand in node.operands)
+        return order
+
+    @staticmethod
+    def _apply(op, args, out):
+        if op == "union":
+            return np.maximum(args[0], args[1], out=out)
+        if op == "intersection":
+            return np.minimum(args[0], args[1], out=out)
+        if op == "complement":
+            return np.subtract(1, args[0], out=out)
+        np.subtract(1, args[1], out=out)
+        return np.minimum(args[0], out, out=out)
+
+    @property
+    def memberships(self):
+        if self._memberships is None:
+            order = self._pending()
+            size = len(self.universe)
+            result = np.empty(size)
+            chunk = min(self.chunk_size, max(size, 1))
+            scratch = {id(node): np.empty(chunk) for node in order if node is not self}
+            for start in range(0, size, chunk):
+                stop = min(start + chunk, size)
+                for node in order:
+                    out = result[start:stop] if node is self else scratch[id(node)][:stop - start]
+                    args = [o._memberships[start:stop] if o._memberships is not None else scratch[id(o)][:stop - start]
+                            for o in node.operands]
+                    self._apply(node.op, args, out)
+            self._memberships = result
+        return self._memberships
+
+    def __getitem__(self, x):
+        # A single element is evaluated on its own, without the full pass
+        i = self.universe.index[x]
+        values = {}
+        for node in self._pending():
+            args = [np.array(o._memberships[i] if o._memberships is not None else values[id(o)]) for o in node.operands]
+            values[id(node)] = self._apply(node.op, args, np.empty(()))
+        return float(self._memberships[i] if self._memberships is not None else values[id(self)])
+
+    def evaluate(self):
+        return ArrayFuzzySet(self.universe, self.memberships)
+
+    def to_dict(self, drop_zeros=False):
+        return self.evaluate().to_dict(drop_zeros)
+
+    def __repr__(self):
+        return str(self.to_dict())
+
+def _lukasiewicz(a, b, out):
+    np.add(a, b, out=out)
+    out -= 1
+    return np.maximum(out, 0, out=out)
+
+# t-norms for MatrixFuzzyRelation.compose; each is called as tnorm(a, b, out=...)
+TNORMS = {
+    "min": np.minimum,
+    "product": np.multiply,
+    "lukasiewicz": _lukasiewicz,
+}
+
+# Bytes allowed for the temporary (rows x inner x cols) block of a composition
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+def composition_blocks(n_rows, n_inner, n_cols, memory_budget=DEFAULT_MEMORY_BUDGET):
+    # Largest row and inner blocks whose float64 temporary fits the budget,
+    # preferring to keep the whole inner dimension in one block.
+    per_inner = 8 * max(n_cols, 1)
+    inner = max(1, min(n_inner, memory_budget // per_inner))
+    rows = max(1, min(n_rows, memory_budget // (per_inner * inner)))
+    return rows, inner
+
+def _compose_into(a, b, out, tnorm, memory_budget):
+    # out = max(out, max_j tnorm(a[:, j], b[j, :])) over row/inner blocks so
+    # the 3-d temporary stays within memory_budget
+    n, inner = a.shape
+    m = b.shape[1]
+    if not (n and inner and m):
+        return
+    row_block, inner_block = composition_blocks(n, inner, m, memory_budget)
+    scratch = np.empty((row_block, inner_block, m))
+    for i in range(0, n, row_block):
+        for j in range(0, inner, inner_block):
+            block = a[i:i + row_block, j:j + inner_block]
+            t = scratch[:block.shape[0], :block.shape[1]]
+            tnorm(block[:, :, None], b[None, j:j + block.shape[1], :], out=t)
+            np.maximum(out[i:i + block.shape[0]], t.max(axis=1), out=out[i:i + block.shape[0]])
+
+def _compose_rows(left_path, right_path, out_path, start, stop, tnorm, memory_budget):
+    # Process-pool worker: composes rows start:stop of the memory-mapped left
+    # matrix and writes them straight into the memory-mapped result
+    tnorm = TNORMS[tnorm] if isinstance(tnorm, str) else tnorm
+    left = np.load(left_path, mmap_mode="r")
+    right = np.load(right_path, mmap_mode="r")
+    out = np.load(out_path, mmap_mode="r+")
+    _compose_into(left[start:stop], right, out[start:stop], tnorm, memory_budget)
+    out.flush()
+    return start, stop
+
+# On-disk relation format: a directory holding the membership matrix as .npy
+# (so it can be memory-mapped) and the pickled row and column elements. A
+# FuzzyRelation that does not define every pair also stores the flat matrix
+# positions of the pairs it does define.
+MATRIX_FILE = "matrix.npy"
+UNIVERSES_FILE = "universes.pickle"
+PAIRS_FILE = "pairs.npy"
+
+def _spanning_tree_closure(matrix):
+    # For a symmetric relation, the strongest path between x != z is the
+    # one through the maximum spanning tree, and its strength is the
+    # weakest tree edge on it. Prim's algorithm builds the tree in n vector
+    # steps; joining its edges strongest first, every pair between the two
+    # joined components gets that edge's weight. Each pair is written once.
+    n = len(matrix)
+    closure = np.zeros((n, n))
+    if n == 0:
+        return closure
+    best = matrix[0].copy()
+    parent = np.zeros(n, dtype=np.intp)
+    in_tree = np.zeros(n, dtype=bool)
+    in_tree[0] = True
+    best[0] = -np.inf
+    edges = []
+    for _ in range(n - 1):
+        v = int(np.argmax(best))
+        edges.append((best[v], int(parent[v]), v))
+        in_tree[v] = True
+        best[v] = -np.inf
+        better = (matrix[v] > best) & ~in_tree
+        best[better] = matrix[v][better]
+        parent[better] = v
+    label = np.arange(n)
+    members = {i: [i] for i in range(n)}
+    for weight, a, b in sorted(edges, key=lambda edge: edge[0], reverse=True):
+        small, large = sorted((label[a], label[b]), key=lambda c: len(members[c]))
+        closure[np.ix_(members[small], members[large])] = weight
+        closure[np.ix_(members[large], members[small])] = weight
+        label[members[small]] = large
+        members[large] += members.pop(small)
+    # x reaches itself through its strongest neighbour, x -> y -> x
+    off_diagonal = matrix.copy()
+    np.fill_diagonal(off_diagonal, 0)
+    np.fill_diagonal(closure, np.maximum(np.diag(matrix), off_diagonal.max(axis=1)))
+    return closure
+
+class MatrixFuzzyRelation:
+    # Dense relation: matrix[i, k] is the membership of (rows.elements[i], cols.elements[k])
+    def __init__(self, rows, cols, matrix):
+        self.rows = rows
+        self.cols = cols
+        self.matrix = np.asarray(matrix, dtype=float)
+        if self.matrix.shape != (len(rows), len(cols)):
+            raise ValueError("Matrix shape must match the row and column universes")
+        # Directory this relation was loaded from, if its matrix is memory-mapped
+        self.path = None
+
+    @classmethod
+    def from_sets(cls, set1, set2):
+        # Cartesian product min(A(x), B(y)) of two FuzzySets or ArrayFuzzySets
+        if isinstance(set1, FuzzySet):
+            set1 = ArrayFuzzySet.from_fuzzy_set(set1)
+        if isinstance(set2, FuzzySet):
+            set2 = ArrayFuzzySet.from_fuzzy_set(set2)
+        return cls(set1.universe, set2.universe, np.minimum.outer(set1.memberships, set2.memberships))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, MATRIX_FILE), self.matrix)
+        self._save_header(path, self.rows, self.cols)
+
+    @staticmethod
+    def _save_header(path, rows, cols):
+        # A matrix defines every pair, so a pair list left by an earlier
+        # FuzzyRelation.save in the same directory is removed
+        with open(os.path.join(path, UNIVERSES_FILE), "wb") as f:
+            pickle.dump((rows.elements, cols.elements), f, protocol=pickle.HIGHEST_PROTOCOL)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(path, PAIRS_FILE))
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        # The matrix stays on disk and is paged in as it is read; pass
+        # mmap_mode=None to read it fully into memory instead
+        with open(os.path.join(path, UNIVERSES_FILE), "rb") as f:
+            rows, cols = pickle.load(f)
+        relation = cls(Universe(rows), Universe(cols), np.load(os.path.join(path, MATRIX_FILE), mmap_mode=mmap_mode))
+        if mmap_mode is not None:
+            relation.path = path
+        return relation
+
+    def to_dict(self):
+        return dict(zip(itertools.product(self.rows.elements, self.cols.elements), self.matrix.ravel().tolist()))
+
+    def to_relation(self):
+        relation = FuzzyRelation.__new__(FuzzyRelation)
+        relation.relation = self.to_dict()
+        return relation
+
+    def _aligned(self, other):
+        # other's matrix with rows ordered like self.cols; missing rows are 0
+        if other.rows is self.cols or other.rows.elements == self.cols.elements:
+            return other.matrix
+        aligned = np.zeros((len(self.cols), len(other.cols)))
+        pairs = [(j, other.rows.index[y]) for j, y in enumerate(self.cols.elements) if y in other.rows]
+        if pairs:
+            dst, src = zip(*pairs)
+            aligned[list(dst)] = other.matrix[list(src)]
+        return aligned
+
+    def compose(self, other, tnorm="min", memory_budget=DEFAULT_MEMORY_BUDGET):
+        # result[i, k] = max_j tnorm(self[i, j], other[j, k]), computed over
+        # row/inner blocks so the 3-d temporary stays within memory_budget
+        tnorm = TNORMS[tnorm] if isinstance(tnorm, str) else tnorm
+        out = np.zeros((len(self.rows), len(other.cols)))
+        _compose_into(self.matrix, self._aligned(other), out, tnorm, memory_budget)
+        return MatrixFuzzyRelation(self.rows, other.cols, out)
+
+    def compose_out_of_core(self, other, path, tnorm="min", processes=None, block_rows=None,
+                            memory_budget=DEFAULT_MEMORY_BUDGET):
+        # Like compose, but the result is written to the relation directory
+        # at path and returned memory-mapped. Row blocks are farmed out to a
+        # process pool; workers map both operands from disk (operands not
+        # loaded from disk are saved to a scratch directory first), so no
+        # process ever holds more than its blocks and the budgeted temporary.
+        # tnorm must be a name from TNORMS or a picklable function.
+        if not (other.rows is self.cols or other.rows.elements == self.cols.elements):
+            raise ValueError("Out-of-core composition needs other's rows in the order of self's columns")
+        # The result file is created (truncated) before the workers read the
+        # operands, so it must not be where either operand is mapped from
+        target = os.path.realpath(path)
+        if any(operand.path is not None and os.path.realpath(operand.path) == target for operand in (self, other)):
+            raise ValueError(f"Cannot write the composition into {path}, an operand is memory-mapped from it")
+        processes = processes or os.cpu_count() or 1
+        n = len(self.rows)
+        if block_rows is None:
+            block_rows = max(1, math.ceil(n / (4 * processes)))
+        os.makedirs(path, exist_ok=True)
+        out_path = os.path.join(path, MATRIX_FILE)
+        np.lib.format.open_memmap(out_path, mode="w+", shape=(n, len(other.cols))).flush()
+        self._save_header(path, self.rows, other.cols)
+        with tempfile.TemporaryDirectory() as scratch:
+            left_path = self._matrix_file(os.path.join(scratch, "left"))
+            right_path = other._matrix_file(os.path.join(scratch, "right"))
+            jobs = [(left_path, right_path, out_path, start, min(start + block_rows, n), tnorm, memory_budget)
+                    for start in range(0, n, block_rows)]
+            if processes == 1 or len(jobs) <= 1:
+                for job in jobs:
+                    _compose_rows(*job)
+            else:
+                with ProcessPoolExecutor(max_workers=processes) as pool:
+                    list(pool.map(_compose_rows, *zip(*jobs)))
+        return MatrixFuzzyRelation.load(path)
+
+    def _matrix_file(self, scratch):
+        # .npy file holding this matrix, writing one under scratch if needed
+        if self.path is None:
+            self.save(scratch)
+            return os.path.join(scratch, MATRIX_FILE)
+        return os.path.join(self.path, MATRIX_FILE)
+
+    def max_min_composition(self, other, memory_budget=DEFAULT_MEMORY_BUDGET):
+        return self.compose(other, "min", memory_budget)
+
+    def max_product_composition(self, other, memory_budget=DEFAULT_MEMORY_BUDGET):
+        return self.compose(other, "product", memory_budget)
+
+    def transitive_closure(self, tnorm="min", method="auto", memory_budget=DEFAULT_MEMORY_BUDGET):
+        # "warshall": one Floyd-Warshall style pass, n vectorized rank-one
+        # updates; O(n^3) element operations, about 3 s at n = 1000.
+        # "spanning_tree": max-min closure of a symmetric relation, the
+        # weakest link on the maximum spanning tree path; O(n^2), well under
+        # a second at n = 1000. "squaring": R <- max(R, R o R) until nothing
+        # changes; up to log2(n) full compositions, each O(n^3) through a
+        # 3-d temporary, so several times slower than warshall. "auto" picks
+        # spanning_tree when it applies and warshall otherwise.
+        if self.rows.elements != self.cols.elements:
+            raise ValueError("Transitive closure needs a square relation over one universe")
+        norm = TNORMS[tnorm] if isinstance(tnorm, str) else tnorm
+        if method == "auto":
+            symmetric = norm is np.minimum and np.array_equal(self.matrix, self.matrix.T)
+            method = "spanning_tree" if symmetric else "warshall"
+        if method == "spanning_tree":
+            if norm is not np.minimum or not np.array_equal(self.matrix, self.matrix.T):
+                raise ValueError("The spanning_tree method needs a symmetric relation and the min t-norm")
+            return MatrixFuzzyRelation(self.rows, self.cols, _spanning_tree_closure(self.matrix))
+        matrix = self.matrix.copy()
+        if method == "warshall":
+            scratch = np.empty_like(matrix)
+            for k in range(len(matrix)):
+                norm(matrix[:, k, None], matrix[None, k, :], out=scratch)
+                np.maximum(matrix, scratch, out=matrix)
+            return MatrixFuzzyRelation(self.rows, self.cols, matrix)
+        if method != "squaring":
+            raise ValueError(f"Unknown method {method!r}")
+        current = MatrixFuzzyRelation(self.rows, self.cols, matrix)
+        for _ in range(max(1, len(matrix)).bit_length() + 1):
+            squared = current.compose(current, norm, memory_budget).matrix
+            np.maximum(squared, current.matrix, out=squared)
+            if np.array_equal(squared, current.matrix):
+                break
+            current = MatrixFuzzyRelation(self.rows, self.cols, squared)
+        return current
+
+    def __repr__(self):
+        return str(self.to_dict())
+
+def _reduce_max(keys, values):
+    # Collapse duplicate keys, keeping the largest value; keys come back sorted
+    if len(keys) == 0:
+        return keys, values
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.maximum.reduceat(values, starts)
+
+def _ragged_positions(starts, counts):
+    # Concatenation of range(s, s + c) for every start/count pair
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + np.arange(offsets.size) - offsets
+
+class SparseFuzzyRelation:
+    # CSR storage of the nonzero memberships only: the entries of row i are
+    # indices[indptr[i]:indptr[i + 1]] (column positions, ascending) with
+    # memberships values[indptr[i]:indptr[i + 1]].
+    def __init__(self, rows, cols, indptr, indices, values):
+        self.rows = rows
+        self.cols = cols
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.values = np.asarray(values, dtype=float)
+
+    @classmethod
+    def from_keys(cls, rows, cols, keys, values):
+        # keys are row * len(cols) + col, sorted and unique; zeros are dropped
+        keep = values != 0
+        keys, values = keys[keep], values[keep]
+        row = keys // max(len(cols), 1)
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row, minlength=len(rows)), out=indptr[1:])
+        return cls(rows, cols, indptr, keys % max(len(cols), 1), values)
+
+    @classmethod
+    def from_dict(cls, relation, rows=None, cols=None):
+        if rows is None:
+            rows = Universe(dict.fromkeys(x for x, _ in relation))
+        if cols is None:
+            cols = Universe(dict.fromkeys(y for _, y in relation))
+        count = len(relation)
+        i = np.fromiter((rows.index[x] for x, _ in relation), dtype=np.int64, count=count)
+        k = np.fromiter((cols.index[y] for _, y in relation), dtype=np.int64, count=count)
+        values = np.fromiter(relation.values(), dtype=float, count=count)
+        return cls.from_keys(rows, cols, *_reduce_max(i * len(cols) + k, values))
+
+    @classmethod
+    def from_relation(cls, relation, rows=None, cols=None):
+        return cls.from_dict(relation.relation, rows, cols)
+
+    @classmethod
+    def from_matrix(cls, matrix_relation):
+        keys = np.flatnonzero(matrix_relation.matrix)
+        return cls.from_keys(matrix_relation.rows, matrix_relation.cols, keys, matrix_relation.matrix.ravel()[keys])
+
+    @property
+    def nnz(self):
+        return len(self.values)
+
+    def keys(self):
+        row = np.repeat(np.arange(len(self.rows), dtype=np.int64), np.diff(self.indptr))
+        return row * len(self.cols) + self.indices
+
+    def to_matrix(self):
+        matrix = np.zeros((len(self.rows), len(self.cols)))
+        matrix.ravel()[self.keys()] = self.values
+        return MatrixFuzzyRelation(self.rows, self.cols, matrix)
+
+    def to_dict(self):
+        row = np.repeat(np.arange(len(self.rows)), np.diff(self.indptr))
+        return {(self.rows.elements[i], self.cols.elements[k]): v
+                for i, k, v in zip(row.tolist(), self.indices.tolist(), self.values.tolist())}
+
+    def __getitem__(self, pair):
+        i, k = self.rows.index[pair[0]], self.cols.index[pair[1]]
+        start, end = self.indptr[i], self.indptr[i + 1]
+        pos = start + np.searchsorted(self.indices[start:end], k)
+        return float(self.values[pos]) if pos < end and self.indices[pos] == k else 0.0
+
+    def _check(self, other):
+        if other.rows is not self.rows or other.cols is not self.cols:
+            raise ValueError("Relations must share the same row and column Universes")
+
+    def union(self, other):
+        self._check(other)
+        keys, values = _reduce_max(np.concatenate([self.keys(), other.keys()]), np.concatenate([self.values, other.values]))
+        return SparseFuzzyRelation.from_keys(self.rows, self.cols, keys, values)
+
+    def intersection(self, other):
+        # Only pairs nonzero in both relations can be nonzero in the result
+        self._check(other)
+        keys, mine, theirs = np.intersect1d(self.keys(), other.keys(), assume_unique=True, return_indices=True)
+        return SparseFuzzyRelation.from_keys(self.rows, self.cols, keys, np.minimum(self.values[mine], other.values[theirs]))
+
+    def difference(self, other):
+        # min(R, 1 - S): zero wherever R is zero, R itself wherever S is zero
+        self._check(other)
+        keys = self.keys()
+        values = self.values.copy()
+        _, mine, theirs = np.intersect1d(keys, other.keys(), assume_unique=True, return_indices=True)
+        values[mine] = np.minimum(values[mine], 1 - other.values[theirs])
+        return SparseFuzzyRelation.from_keys(self.rows, self.cols, keys, values)
+
+    def compose(self, other, tnorm="min", memory_budget=DEFAULT_MEMORY_BUDGET):
+        # Every nonzero (i, j) of self is joined with the nonzeros of row j of
+        # other; rows of self are taken in chunks whose joined entries fit the
+        # budget, and duplicates (i, k) are reduced with max.
+        tnorm = TNORMS[tnorm] if isinstance(tnorm, str) else tnorm
+        if other.rows is self.cols or other.rows.elements == self.cols.elements:
+            middle = np.arange(len(self.cols))
+        else:
+            middle = np.array([other.rows.index.get(y, -1) for y in self.cols.elements], dtype=np.int64)
+        target = middle[self.indices] if len(self.indices) else self.indices
+        present = target >= 0
+        starts = np.where(present, other.indptr[target], 0)
+        counts = np.where(present, other.indptr[target + 1] - starts, 0)
+        work = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=work[1:])
+        row_work = work[self.indptr]
+        row_of = np.repeat(np.arange(len(self.rows), dtype=np.int64), np.diff(self.indptr))
+        max_entries = max(1, memory_budget // 40)
+
+        keys, values = [], []
+        row = 0
+        while row < len(self.rows):
+            end = int(np.searchsorted(row_work, row_work[row] + max_entries, side="right")) - 1
+            end = min(max(end, row + 1), len(self.rows))
+            p0, p1 = self.indptr[row], self.indptr[end]
+            if row_work[end] > row_work[row]:
+                c = counts[p0:p1]
+                positions = _ragged_positions(starts[p0:p1], c)
+                joined = tnorm(np.repeat(self.values[p0:p1], c), other.values[positions], out=np.empty(positions.size))
+                chunk_keys, chunk_values = _reduce_max(np.repeat(row_of[p0:p1], c) * len(other.cols) + other.indices[positions], joined)
+                keys.append(chunk_keys)
+                values.append(chunk_values)
+            row = end
+        if not keys:
+            return SparseFuzzyRelation.from_keys(self.rows, other.cols, np.zeros(0, dtype=np.int64), np.zeros(0))
+        return SparseFuzzyRelation.from_keys(self.rows, other.cols, np.concatenate(keys), np.concatenate(values))
+
+    def max_min_composition(self, other, memory_budget=DEFAULT_MEMORY_BUDGET):
+        return self.compose(other, "min", memory_budget)
+
+    def __repr__(self):
+        return str(self.to_dict())
+
+# Membership functions for FuzzyVariable terms; each takes and returns arrays
+def triangular(a, b, c):
+    return trapezoidal(a, b, b, c)
+
+def trapezoidal(a, b, c, d):
+    def membership(x):
+        x = np.asarray(x, dtype=float)
+        rise = (x - a) / (b - a) if b > a else (x >= b).astype(float)
+        fall = (d - x) / (d - c) if d > c else (x <= c).astype(float)
+        return np.clip(np.minimum(rise, fall), 0, 1)
+    return membership
+
+def gaussian(mean, sigma):
+    def membership(x):
+        return np.exp(-0.5 * ((np.asarray(x, dtype=float) - mean) / sigma) ** 2)
+    return membership
+
+class FuzzyVariable:
+    # A named linguistic variable on [low, high]; grid is the sampling used
+    # for aggregation and centroid defuzzification (output) or for lookup
+    # tables (inputs).
+    def __init__(self, name, low, high, terms, resolution=201):
+        self.name = name
+        self.low = low
+        self.high = high
+        self.terms = dict(terms)
+        self.grid = np.linspace(low, high, resolution)
+        self._universe = None
+
+    @property
+    def universe(self):
+        if self._universe is None:
+            self._universe = Universe(self.grid.tolist())
+        return self._universe
+
+    def term_set(self, term):
+        return ArrayFuzzySet(self.universe, self.terms[term](self.grid))
+
+class FuzzyRule:
+    # IF var1 IS term1 AND var2 IS term2 ... THEN output IS consequent
+    def __init__(self, antecedents, consequent, weight=1.0):
+        self.antecedents = dict(antecedents)
+        self.consequent = consequent
+        self.weight = weight
+
+    def __repr__(self):
+        conditions = " AND ".join(f"{var} IS {term}" for var, term in self.antecedents.items())
+        return f"IF {conditions} THEN {self.consequent}"
+
+class MamdaniSystem:
+    # Min implication, max aggregation and centroid defuzzification, each
+    # evaluated for a whole batch of inputs at once.
+    def __init__(self, inputs, output, rules, and_op=np.minimum):
+        self.inputs = {variable.name: variable for variable in inputs}
+        self.output = output
+        self.rules = list(rules)
+        self.and_op = and_op
+        for rule in self.rules:
+            for var, term in rule.antecedents.items():
+                if term not in self.inputs[var].terms:
+                    raise ValueError(f"Unknown term {term!r} for input {var!r}")
+            if rule.consequent not in output.terms:
+                raise ValueError(f"Unknown output term {rule.consequent!r}")
+        self.output_terms = sorted({rule.consequent for rule in self.rules})
+        self._curves = np.array([output.terms[t](output.grid) for t in self.output_terms]).reshape(len(self.output_terms), len(output.grid))
+        self._rule_terms = [self.output_terms.index(rule.consequent) for rule in self.rules]
+
+    def _batch(self, inputs):
+        arrays = np.broadcast_arrays(*(np.atleast_1d(np.asarray(inputs[name], dtype=float)) for name in self.inputs))
+        return {name: array.ravel() for name, array in zip(self.inputs, arrays)}
+
+    def memberships(self, inputs):
+        # (variable, term) -> membership array, only for terms the rules use
+        x = self._batch(inputs)
+        return {(var, term): self.inputs[var].terms[term](x[var])
+                for rule in self.rules for var, term in rule.antecedents.items()}
+
+    def rule_strengths(self, inputs=None, memberships=None):
+        # (rules, batch) firing strengths
+        if memberships is None:
+            memberships = self.memberships(inputs)
+        size = len(next(iter(memberships.values()))) if memberships else 1
+        strengths = np.ones((len(self.rules), size))
+        for r, rule in enumerate(self.rules):
+            for var, term in rule.antecedents.items():
+                self.and_op(strengths[r], memberships[(var, term)], out=strengths[r])
+            strengths[r] *= rule.weight
+        return strengths
+
+    def aggregate(self, strengths):
+        # (batch, grid) output membership: max over rules of min(strength, term curve).
+        # Rules sharing a consequent are merged first since min(s, c) is monotone in s.
+        term_strengths = np.zeros((len(self.output_terms), strengths.shape[1]))
+        for r, t in enumerate(self._rule_terms):
+            np.maximum(term_strengths[t], strengths[r], out=term_strengths[t])
+        aggregated = np.zeros((strengths.shape[1], len(self.output.grid)))
+        for t, curve in enumerate(self._curves):
+            np.maximum(aggregated, np.minimum(term_strengths[t][:, None], curve[None, :]), out=aggregated)
+        return aggregated
+
+    def defuzzify(self, aggregated, default=np.nan):
+        # Centroid; inputs that fire no rule get default
+        area = aggregated.sum(axis=1)
+        moment = aggregated @ self.output.grid
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(area > 0, moment / area, default)
+
+    def evaluate(self, inputs, batch_size=4096, default=np.nan, memberships=None):
+        # Crisp outputs for every input; the batch is cut into chunks so the
+        # (chunk, grid) aggregation array stays small.
+        strengths = self.rule_strengths(inputs, memberships)
+        size = strengths.shape[1]
+        result = np.empty(size)
+        for start in range(0, size, batch_size):
+            chunk = strengths[:, start:start + batch_size]
+            result[start:start + batch_size] = self.defuzzify(self.aggregate(chunk), default)
+        return result
+
+    def output_set(self, inputs):
+        # Aggregated output of a single input as an ArrayFuzzySet
+        aggregated = self.aggregate(self.rule_strengths(inputs))
+        return ArrayFuzzySet(self.output.universe, aggregated[0])
+
+# Largest output table MamdaniLookup builds; it has one cell per combination
+# of input grid points, i.e. resolution ** number of inputs
+MAX_TABLE_CELLS = 1_000_000
+
+class MamdaniLookup:
+    # Precomputed tables over each input's grid: term memberships per grid
+    # point (rule activations without evaluating membership functions) and,
+    # optionally, the crisp output for every grid combination. Inputs are
+    # snapped to the nearest grid point.
+    def __init__(self, system, output_table=False, batch_size=4096, max_table_cells=MAX_TABLE_CELLS):
+        self.system = system
+        self.activation_tables = {}
+        for rule in system.rules:
+            for var, term in rule.antecedents.items():
+                variable = system.inputs[var]
+                self.activation_tables[(var, term)] = variable.terms[term](variable.grid)
+        self.table = None
+        if output_table:
+            cells = math.prod(len(v.grid) for v in system.inputs.values())
+            if cells > max_table_cells:
+                raise ValueError(f"Output table would have {cells} cells, more than max_table_cells={max_table_cells}")
+            grids = np.meshgrid(*(np.arange(len(v.grid)) for v in system.inputs.values()), indexing="ij")
+            positions = {name: grid.ravel() for name, grid in zip(system.inputs, grids)}
+            shape = grids[0].shape if grids else ()
+            self.table = system.evaluate(None, batch_size, memberships=self._memberships(positions)).reshape(shape)
+
+    def positions(self, inputs):
+        x = self.system._batch(inputs)
+        positions = {}
+        for name, variable in self.system.inputs.items():
+            step = (variable.high - variable.low) / (len(variable.grid) - 1)
+            positions[name] = np.clip(np.rint((x[name] - variable.low) / step), 0, len(variable.grid) - 1).astype(np.intp)
+        return positions
+
+    def _memberships(self, positions):
+        return {(var, term): table[positions[var]] for (var, term), table in self.activation_tables.items()}
+
+    def rule_strengths(self, inputs):
+        return self.system.rule_strengths(memberships=self._memberships(self.positions(inputs)))
+
+    def evaluate(self, inputs, default=np.nan):
+        positions = self.positions(inputs)
+        if self.table is not None:
+            # The table holds NaN where no rule fires
+            result = self.table[tuple(positions[name] for name in self.system.inputs)]
+            return np.where(np.isnan(result), default, result)
+        return self.system.evaluate(None, memberships=self._memberships(positions), default=default)
+
 # Example Usage
 A = FuzzySet({'x1': 0.2, 'x2': 0.7, 'x3': 1.0})
 B = FuzzySet({'x1': 0.5, 'x2': 0.4, 'x3': 0.8})
@@ -49,6 +1003,37 @@ print("Fuzzy Relation R1:", R1)
 print("Fuzzy Relation R2:", R2)
 print("Max-Min Composition of R1 and R2:", R1.max_min_composition(R2))
 
+# Array-backed sets over a shared universe
+X = Universe(['x1', 'x2', 'x3'])
+A_arr = ArrayFuzzySet.from_fuzzy_set(A, X)
+B_arr = ArrayFuzzySet.from_fuzzy_set(B, X)
+print("Array Union:", A_arr.union(B_arr))
+print("Array Difference A - B:", A_arr.difference(B_arr))
+print("Lazy (A ∪ B) ∩ ¬A:", A_arr.lazy().union(B_arr).intersection(A_arr.complement()))
+
+# Dense matrix relations
+M1 = MatrixFuzzyRelation.from_sets(A, C)
+M2 = MatrixFuzzyRelation.from_sets(C, B)
+print("Matrix Max-Product Composition of R1 and R2:", M1.max_product_composition(M2))
+print("Transitive Closure of A x B:", FuzzyRelation(A, B).transitive_closure())
+print("Cylindrical Max-Min Composition of R1 and R2:", CylindricalRelation(A, C).max_min_composition(CylindricalRelation(C, B)))
+
+# Sparse relations keep only nonzero memberships
+S1 = SparseFuzzyRelation.from_dict({('x1', 'y1'): 0.4, ('x2', 'y2'): 0.9, ('x3', 'y1'): 0.0})
+S2 = SparseFuzzyRelation.from_dict({('y1', 'x1'): 0.5, ('y2', 'x3'): 0.8})
+print("Sparse Max-Min Composition:", S1.max_min_composition(S2))
+
+# Mamdani inference over a batch of inputs
+service = FuzzyVariable("service", 0, 10, {"poor": trapezoidal(0, 0, 2, 5), "good": triangular(2, 5, 8), "excellent": trapezoidal(5, 8, 10, 10)})
+food = FuzzyVariable("food", 0, 10, {"bad": trapezoidal(0, 0, 3, 7), "tasty": trapezoidal(3, 7, 10, 10)})
+tip = FuzzyVariable("tip", 0, 30, {"low": triangular(0, 5, 10), "medium": triangular(10, 15, 20), "high": triangular(20, 25, 30)})
+tipping = MamdaniSystem([service, food], tip, [
+    FuzzyRule({"service": "poor", "food": "bad"}, "low"),
+    FuzzyRule({"service": "good"}, "medium"),
+    FuzzyRule({"service": "excellent", "food": "tasty"}, "high"),
+])
+print("Tips for service [2, 5, 9], food [3, 6, 9]:", tipping.evaluate({"service": [2, 5, 9], "food": [3, 6, 9]}))
+
 
 """
 
@@ -1,18 +1,348 @@
+import bisect
+import hashlib
+import heapq
+import itertools
+import math
 import random
+import threading
+from operator import itemgetter
+
+class IndexedHeap:
+	# Binary min-heap over items 0..n-1 that can change the key of any item
+	# in O(log n); position[item] is where the item sits in heap.
+	def __init__(self, keys):
+		self.keys = list(keys)
+		self.heap = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+		self.position = [0] * len(self.heap)
+		for pos, item in enumerate(self.heap):
+			self.position[item] = pos
+
+	def top(self):
+		return self.heap[0]
+
+	def push(self, key):
+		# Adds item len(keys) and returns it
+		item = len(self.keys)
+		self.keys.append(key)
+		self.position.append(len(self.heap))
+		self.heap.append(item)
+		self._sift_up(len(self.heap) - 1)
+		return item
+
+	def remove(self, item):
+		# The last item is renumbered to item so items stay 0..n-1; keys
+		# that embed the item number must be updated by the caller
+		pos = self.position[item]
+		self._swap(pos, len(self.heap) - 1)
+		self.heap.pop()
+		if pos < len(self.heap):
+			moved = self.heap[pos]
+			self._sift_up(pos)
+			self._sift_down(self.position[moved])
+		last = len(self.keys) - 1
+		if item != last:
+			self.keys[item] = self.keys[last]
+			self.position[item] = self.position[last]
+			self.heap[self.position[item]] = item
+		self.keys.pop()
+		self.position.pop()
+
+	def update(self, item, key):
+		old = self.keys[item]
+		self.keys[item] = key
+		if key < old:
+			self._sift_up(self.position[item])
+		else:
+			self._sift_down(self.position[item])
+
+	def _swap(self, i, j):
+		heap = self.heap
+		heap[i], heap[j] = heap[j], heap[i]
+		self.position[heap[i]] = i
+		self.position[heap[j]] = j
+
+	def _sift_up(self, pos):
+		keys, heap = self.keys, self.heap
+		while pos:
+			parent = (pos - 1) >> 1
+			if keys[heap[parent]] <= keys[heap[pos]]:
+				break
+			self._swap(pos, parent)
+			pos = parent
+
+	def _sift_down(self, pos):
+		keys, heap = self.keys, self.heap
+		n = len(heap)
+		while True:
+			child = 2 * pos + 1
+			if child >= n:
+				break
+			if child + 1 < n and keys[heap[child + 1]] < keys[heap[child]]:
+				child += 1
+			if keys[heap[pos]] <= keys[heap[child]]:
+				break
+			self._swap(pos, child)
+			pos = child
+
+class HashRing:
+	# Consistent-hash ring: each server owns vnodes * weight points (weight
+	# is relative, 1 = an average server; at most max_vnodes points) on a
+	# sorted ring of 64-bit hashes, and a key goes to the first point at or
+	# after its own hash. Adding or removing a server only merges in or
+	# filters out that server's points in one O(N) pass, so about 1/N of
+	# the keys move. Updates build new lists and publish them with one
+	# assignment, so lookups from other threads never lock and never see a
+	# half-updated ring.
+	def __init__(self, servers=(), vnodes=100, weights=None, max_vnodes=None):
+		self.vnodes = vnodes
+		self.max_vnodes = max_vnodes or 10 * vnodes
+		self.replicas = {}
+		self._lock = threading.Lock()
+		points = []
+		for i, server in enumerate(servers):
+			if server in self.replicas:
+				raise ValueError(f"{server} is already on the ring")
+			self.replicas[server] = self._replica_count(weights[i] if weights is not None else 1)
+			points += self._server_points(server)
+		points.sort(key=itemgetter(0))
+		self.points = ([h for h, _ in points], [server for _, server in points])
+
+	def _replica_count(self, weight):
+		return min(max(1, round(self.vnodes * weight)), self.max_vnodes)
+
+	def _server_points(self, server):
+		return [(self.hash(f"{server}#{replica}"), server) for replica in range(self.replicas[server])]
+
+	@staticmethod
+	def hash(key):
+		return int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=8).digest(), "big")
+
+	def __len__(self):
+		return len(self.replicas)
+
+	def __contains__(self, server):
+		return server in self.replicas
+
+	@property
+	def hashes(self):
+		return self.points[0]
+
+	@property
+	def owners(self):
+		return self.points[1]
+
+	def add(self, server, weight=1):
+		with self._lock:
+			if server in self.replicas:
+				raise ValueError(f"{server} is already on the ring")
+			self.replicas[server] = self._replica_count(weight)
+			new = sorted(self._server_points(server), key=itemgetter(0))
+			points = list(heapq.merge(zip(*self.points), new, key=itemgetter(0)))
+			self.points = ([h for h, _ in points], [owner for _, owner in points])
+
+	def remove(self, server):
+		with self._lock:
+			del self.replicas[server]
+			points = [(h, owner) for h, owner in zip(*self.points) if owner != server]
+			self.points = ([h for h, _ in points], [owner for _, owner in points])
+
+	def lookup(self, key, load=None, capacity=None):
+		# With load and capacity, skip (clockwise) servers whose load has
+		# reached capacity: consistent hashing with bounded loads
+		hashes, owners = self.points
+		if not hashes:
+			raise LookupError("Hash ring is empty")
+		pos = bisect.bisect_left(hashes, self.hash(key)) % len(hashes)
+		if load is None:
+			return owners[pos]
+		seen = set()
+		servers = len(self.replicas)
+		for step in range(len(owners)):
+			server = owners[(pos + step) % len(owners)]
+			if server not in seen:
+				if load(server) < capacity:
+					return server
+				seen.add(server)
+				if len(seen) >= servers:
+					break
+		return owners[pos]
 
 class LoadBalancer:
-	def __init__(self, servers):
-		self.servers = servers
-		self.server_index_rr = 0
+	# Every strategy can be called from many threads and from asyncio code
+	# (nothing blocks). Round-robin advances an itertools.count, whose
+	# next() is atomic, and servers, index and the ring are copy-on-write,
+	# so those picks take no lock. Weighted round-robin has its own lock;
+	# least-connections and acquire/release share the counter lock, held
+	# for a few heap updates. Bounded consistent hashing walks the ring
+	# unlocked and only locks to check capacity and take the slot.
+	# Servers join and leave through add_server() and remove_server(),
+	# which take both locks and update every strategy together.
+	def __init__(self, servers, weights=None, vnodes=100):
+		self.servers = list(servers)
+		self.weights = list(weights) if weights is not None else [1] * len(servers)
+		if len(self.weights) != len(servers) or min(self.weights, default=1) <= 0:
+			raise ValueError("Need one positive weight per server")
+		self._rr = itertools.count()
+		self._lock = threading.Lock()
+		self._wrr_lock = threading.Lock()
+		self.index = {server: i for i, server in enumerate(servers)}
+		# Active requests per server, kept by acquire() and release()
+		self.active = [0] * len(servers)
+		self.total_active = 0
+		# Keys carry the server index so ties go to the earlier server
+		self.least_heap = IndexedHeap((0, i) for i in range(len(servers)))
+		self.weighted_least_heap = IndexedHeap((0.0, i) for i in range(len(servers)))
+		# Weighted round-robin as stride scheduling: server i is due at
+		# (2k + 1) / (2 * weight) for its k-th pick, so each gets weight picks
+		# per sum(weights) and stays within one pick of its share. Equal due
+		# times go to the server picked least recently, so they rotate
+		# instead of favouring low indexes. The order is not nginx's
+		# current_weight sequence (5:1:1 gives aabcaaa, nginx aabacaa), which
+		# would need a pass over every server per pick.
+		self.picks = [0] * len(servers)
+		self._wrr_seq = 0
+		# A server added later starts its schedule at the current due time
+		self.wrr_start = [0.0] * len(servers)
+		self.weighted_rr_heap = IndexedHeap((1 / (2 * w), 0, i) for i, w in enumerate(self.weights))
+		# Ring weights are relative to the initial mean weight, so the ring
+		# has about vnodes * len(servers) points however weights are scaled
+		self._weight_unit = sum(self.weights) / len(self.weights) if self.weights else 1
+		self._ring = HashRing(self.servers, vnodes, [w / self._weight_unit for w in self.weights])
+
+	def add_server(self, server, weight=1):
+		if weight <= 0:
+			raise ValueError("Need a positive weight")
+		with self._lock, self._wrr_lock:
+			if server in self.index:
+				raise ValueError(f"{server} is already in the balancer")
+			i = len(self.servers)
+			start = self.weighted_rr_heap.keys[self.weighted_rr_heap.top()][0] if i else 0.0
+			self.weights.append(weight)
+			self.active.append(0)
+			self.picks.append(0)
+			self.wrr_start.append(start)
+			self.least_heap.push((0, i))
+			self.weighted_least_heap.push((0.0, i))
+			self.weighted_rr_heap.push((start + 1 / (2 * weight), self._wrr_seq, i))
+			self.index = {**self.index, server: i}
+			self.servers = self.servers + [server]
+			self._ring.add(server, weight / self._weight_unit)
+
+	def remove_server(self, server):
+		# Requests still open on server are dropped from the counts, and
+		# their release() calls are ignored
+		with self._lock, self._wrr_lock:
+			i = self.index[server]
+			self._ring.remove(server)
+			last = len(self.servers) - 1
+			servers = self.servers[:]
+			index = dict(self.index)
+			del index[server]
+			self.total_active -= self.active[i]
+			# The last server takes over index i, as in IndexedHeap.remove()
+			for values in (servers, self.weights, self.active, self.picks, self.wrr_start):
+				values[i] = values[last]
+				values.pop()
+			for heap in (self.least_heap, self.weighted_least_heap, self.weighted_rr_heap):
+				heap.remove(i)
+				if i != last:
+					heap.update(i, heap.keys[i][:-1] + (i,))
+			if i != last:
+				index[servers[i]] = i
+			self.index = index
+			self.servers = servers
 
 	def round_robin(self):
-		server = self.servers[self.server_index_rr]
-		self.server_index_rr = (self.server_index_rr + 1) % len(self.servers)
-		return server
+		servers = self.servers
+		return servers[next(self._rr) % len(servers)]
 
 	def random_selection(self):
 		return random.choice(self.servers)
 
+	def least_connections(self):
+		with self._lock:
+			return self.servers[self.least_heap.top()]
+
+	def weighted_least_connections(self):
+		with self._lock:
+			return self.servers[self.weighted_least_heap.top()]
+
+	def weighted_round_robin(self):
+		with self._wrr_lock:
+			i = self.weighted_rr_heap.top()
+			self.picks[i] += 1
+			self._wrr_seq += 1
+			due = self.wrr_start[i] + (2 * self.picks[i] + 1) / (2 * self.weights[i])
+			self.weighted_rr_heap.update(i, (due, self._wrr_seq, i))
+			return self.servers[i]
+
+	def consistent_hash(self, key, load_factor=None):
+		# Same key, same server while the ring is unchanged. With load_factor
+		# c (e.g. 1.25) no server gets more than ceil(c * average) active
+		# requests; keys of a full server spill to the next one on the ring.
+		if load_factor is None:
+			return self._ring.lookup(key)
+		capacity = self._capacity(load_factor)
+		return self._ring.lookup(key, lambda server: self._load(server, capacity), capacity)
+
+	def _capacity(self, load_factor):
+		return math.ceil(load_factor * (self.total_active + 1) / len(self._ring))
+
+	def _load(self, server, capacity):
+		# A server removed since the ring was read counts as full
+		i = self.index.get(server)
+		return capacity if i is None else self.active[i]
+
+	def acquire(self, server):
+		# Call when a request is sent to server; returns server so a pick can
+		# be wrapped directly: lb.acquire(lb.least_connections())
+		with self._lock:
+			self._update_active(self.index[server], 1)
+		return server
+
+	def acquire_consistent_hash(self, key, load_factor=None, attempts=4):
+		# Pick and acquire in one step. The ring walk runs unlocked; the
+		# lock only covers re-checking that the server is still there and
+		# under capacity, and taking the slot, so concurrent callers cannot
+		# all pass the check for one server. If another caller filled it
+		# first, walk again; after attempts misses, walk under the lock.
+		for _ in range(attempts):
+			server = self.consistent_hash(key, load_factor)
+			with self._lock:
+				i = self.index.get(server)
+				if i is not None and (load_factor is None or self.active[i] < self._capacity(load_factor)):
+					self._update_active(i, 1)
+					return server
+		with self._lock:
+			server = self.consistent_hash(key, load_factor)
+			self._update_active(self.index[server], 1)
+		return server
+
+	def acquire_least_connections(self, weighted=False):
+		# Pick and acquire in one step, so concurrent callers cannot all
+		# take the same least-loaded server
+		heap = self.weighted_least_heap if weighted else self.least_heap
+		with self._lock:
+			i = heap.top()
+			self._update_active(i, 1)
+		return self.servers[i]
+
+	def release(self, server):
+		# Call when that request finishes
+		with self._lock:
+			i = self.index.get(server)
+			if i is None:
+				return
+			if self.active[i] == 0:
+				raise ValueError(f"{server} has no active requests")
+			self._update_active(i, -1)
+
+	def _update_active(self, i, delta):
+		self.active[i] += delta
+		self.total_active += delta
+		self.least_heap.update(i, (self.active[i], i))
+		self.weighted_least_heap.update(i, (self.active[i] / self.weights[i], i))
+
 def simulate_client_requests(load_balancer, num_requests):
 	for i in range(num_requests):
 		# Simulating client request
@@ -23,17 +353,29 @@ def simulate_client_requests(load_balancer, num_requests):
 		# Using Random algorithm for load balancing
 		server_random = load_balancer.random_selection()
 		print(f"Random - Server {server_random}")
+		# Using Weighted Round Robin algorithm for load balancing
+		server_wrr = load_balancer.weighted_round_robin()
+		print(f"Weighted Round Robin - Server {server_wrr}")
+		# Using Least Connections algorithm; every third request finishes
+		# before the next one arrives, the others stay open
+		server_lc = load_balancer.acquire_least_connections()
+		print(f"Least Connections - Server {server_lc} ({load_balancer.active[load_balancer.index[server_lc]]} active)")
+		if i % 3 == 2:
+			load_balancer.release(server_lc)
+		# Using Consistent Hashing so a client keeps its server
+		client = f"client-{i % 4}"
+		server_ch = load_balancer.consistent_hash(client)
+		print(f"Consistent Hash ({client}) - Server {server_ch}")
 		print()
 
 if __name__ == "__main__":
 	# List of servers
 	servers = ["Server A", "Server B", "Server C"]
-	# Create a LoadBalancer instance
-	load_balancer = LoadBalancer(servers)
+	# Create a LoadBalancer instance; Server A has twice the capacity
+	load_balancer = LoadBalancer(servers, weights=[2, 1, 1])
 	# Simulate 10 client requests
 	simulate_client_requests(load_balancer, 10)
 
-
 """
 
 What are the common load balancing algorithms?
@@ -0,0 +1,96 @@
+import argparse
+import collections
+import random
+import threading
+import time
+
+from CL3_4 import LoadBalancer
+
+def strategies(load_balancer):
+	# name -> function making one selection from worker thread number index;
+	# connection-based strategies keep a window of open requests per thread
+	def windowed(pick):
+		def make(index, window):
+			held = collections.deque()
+			def select():
+				server = pick(index)
+				held.append(server)
+				if len(held) > window:
+					load_balancer.release(held.popleft())
+				return server
+			return select
+		return make
+
+	def plain(pick):
+		return lambda index, window: lambda: pick(index)
+
+	def key(index):
+		return f"client-{random.randrange(100000)}"
+
+	return {
+		"round_robin": plain(lambda index: load_balancer.round_robin()),
+		"random": plain(lambda index: load_balancer.random_selection()),
+		"weighted_round_robin": plain(lambda index: load_balancer.weighted_round_robin()),
+		"least_connections": windowed(lambda index: load_balancer.acquire_least_connections()),
+		"weighted_least_connections": windowed(lambda index: load_balancer.acquire_least_connections(weighted=True)),
+		"consistent_hash": plain(lambda index: load_balancer.consistent_hash(key(index))),
+		"bounded_consistent_hash": windowed(lambda index: load_balancer.acquire_consistent_hash(key(index), load_factor=1.25)),
+	}
+
+def run(make_select, threads, selections, window):
+	counts = [collections.Counter() for _ in range(threads)]
+	barrier = threading.Barrier(threads + 1)
+
+	def worker(index):
+		select = make_select(index, window)
+		counter = counts[index]
+		barrier.wait()
+		for _ in range(selections):
+			counter[select()] += 1
+
+	workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+	for thread in workers:
+		thread.start()
+	barrier.wait()
+	start = time.perf_counter()
+	for thread in workers:
+		thread.join()
+	elapsed = time.perf_counter() - start
+	return sum(counts, collections.Counter()), elapsed
+
+def fairness(counts, servers, weights):
+	# Jain's index of picks per unit weight (1.0 = perfectly proportional)
+	# and the worst relative deviation from a server's weighted share
+	total = sum(counts.values())
+	shares = [counts[server] / weight for server, weight in zip(servers, weights)]
+	jain = sum(shares) ** 2 / (len(shares) * sum(s * s for s in shares)) if total else 0.0
+	expected = [total * weight / sum(weights) for weight in weights]
+	deviation = max(abs(counts[server] - e) / e for server, e in zip(servers, expected))
+	return jain, deviation
+
+def main():
+	parser = argparse.ArgumentParser(description="Selections per second and fairness of LoadBalancer strategies under threads")
+	parser.add_argument("--servers", type=int, default=100)
+	parser.add_argument("--weighted", action="store_true", help="random weights 1-5 instead of equal weights")
+	parser.add_argument("--threads", default="1,4,16", help="comma separated thread counts")
+	parser.add_argument("--selections", type=int, default=20000, help="selections per thread")
+	parser.add_argument("--window", type=int, default=256,
+		help="open requests each thread keeps for the connection-counting strategies")
+	parser.add_argument("--strategies", default=None, help="comma separated subset to run")
+	parser.add_argument("--seed", type=int, default=0)
+	args = parser.parse_args()
+
+	rng = random.Random(args.seed)
+	servers = [f"server-{i}" for i in range(args.servers)]
+	weights = [rng.randint(1, 5) if args.weighted else 1 for _ in servers]
+	names = args.strategies.split(",") if args.strategies else list(strategies(LoadBalancer(servers, weights)))
+	print(f"{'strategy':>27} {'threads':>8} {'selections/s':>13} {'jain':>7} {'max dev':>8}")
+	for name in names:
+		for threads in [int(t) for t in args.threads.split(",")]:
+			load_balancer = LoadBalancer(servers, weights)
+			counts, elapsed = run(strategies(load_balancer)[name], threads, args.selections, args.window)
+			jain, deviation = fairness(counts, servers, weights)
+			print(f"{name:>27} {threads:>8} {sum(counts.values()) / elapsed:>13.0f} {jain:>7.4f} {deviation:>7.1%}")
+
+if __name__ == "__main__":
+	main()